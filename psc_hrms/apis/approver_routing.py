@@ -0,0 +1,181 @@
+import frappe
+from frappe.utils import now_datetime
+
+ROUTE_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "employee", "department", "supervisor", "supervisor_email", "leave_approver",
+    "hod_approver_emails", "hr_manager_emails",
+)
+
+REBUILD_ALL_JOB_ID = "psc_hrms_rebuild_approver_routes"
+
+# Route rows written per INSERT statement
+UPSERT_CHUNK_SIZE = 1000
+
+def get_approver_route(employee, department=None):
+    """
+    Supervisor email, HOD approver emails, HR Manager emails and leave approver
+    for `employee`, read from Employee Approver Route. A missing row is built
+    on the spot. Pass the `department` a document was raised in: when the
+    employee has moved since, its HOD approvers are read from that department.
+    """
+    fields = ["department", "supervisor", "supervisor_email", "leave_approver", "hod_approver_emails", "hr_manager_emails"]
+    route = frappe.db.get_value("Employee Approver Route", employee, fields, as_dict=True)
+    if not route:
+        rebuild_approver_routes([employee])
+        route = frappe.db.get_value("Employee Approver Route", employee, fields, as_dict=True) or frappe._dict()
+
+    route.hod_approver_emails = _split(route.get("hod_approver_emails"))
+    route.hr_manager_emails = _split(route.get("hr_manager_emails"))
+    if department and department != route.get("department"):
+        route.hod_approver_emails = get_department_approver_emails(department)
+    return route
+
+def get_department_approver_emails(department):
+    return frappe.db.sql_list("""
+        SELECT approver_user.email
+        FROM `tabDepartment Approver` approver
+        JOIN `tabUser` approver_user ON approver_user.name = approver.approver
+        WHERE approver.parent = %s
+            AND approver.parentfield = 'leave_approvers'
+            AND approver.parenttype = 'Department'
+            AND IFNULL(approver_user.email, '') != ''
+        ORDER BY approver.idx
+    """, department)
+
+def _split(emails):
+    return [email for email in (emails or "").split("\n") if email]
+
+def _employee_email(emp):
+    return emp.prefered_email or emp.personal_email or emp.company_email
+
+def rebuild_approver_routes(employees=None):
+    """
+    Recompute the routing rows of `employees` (all when None) from a fixed
+    number of bulk queries and upsert them. Rows are overwritten in place,
+    never deleted first, so concurrent readers always find a route.
+    """
+    emp_fields = ["name", "department", "reports_to", "leave_approver", "prefered_email", "personal_email", "company_email"]
+    targets = frappe.get_all(
+        "Employee",
+        filters={"name": ["in", employees]} if employees is not None else None,
+        fields=emp_fields
+    )
+    if not targets:
+        return
+
+    supervisor_names = list({emp.reports_to for emp in targets if emp.reports_to})
+    supervisors = {
+        emp.name: emp for emp in frappe.get_all(
+            "Employee", filters={"name": ["in", supervisor_names]}, fields=emp_fields
+        )
+    } if supervisor_names else {}
+
+    departments = list({emp.department for emp in targets if emp.department})
+    dept_approvers = {}
+    if departments:
+        for row in frappe.get_all(
+            "Department Approver",
+            filters={"parent": ["in", departments], "parentfield": "leave_approvers", "parenttype": "Department"},
+            fields=["parent", "approver", "idx"],
+            order_by="idx asc"
+        ):
+            if row.approver:
+                dept_approvers.setdefault(row.parent, []).append(row.approver)
+
+    approver_users = list({a for approvers in dept_approvers.values() for a in approvers})
+    user_emails = dict(frappe.get_all(
+        "User", filters={"name": ["in", approver_users]}, fields=["name", "email"], as_list=True
+    )) if approver_users else {}
+
+    hr_managers = frappe.get_all(
+        "Has Role",
+        filters={"role": "HR Manager", "parenttype": "User"},
+        distinct=True,
+        pluck="parent"
+    )
+    hr_manager_emails = sorted(set(frappe.get_all(
+        "User",
+        filters={"name": ["in", hr_managers], "enabled": 1, "email": ["is", "set"]},
+        pluck="email"
+    ))) if hr_managers else []
+
+    now = now_datetime()
+    rows = []
+    for emp in targets:
+        approvers = dept_approvers.get(emp.department, [])
+        supervisor = supervisors.get(emp.reports_to)
+        rows.append((
+            emp.name, now, now, "Administrator", "Administrator", 0,
+            emp.name,
+            emp.department,
+            emp.reports_to,
+            _employee_email(supervisor) if supervisor else None,
+            emp.leave_approver or (approvers[0] if approvers else None),
+            "\n".join(user_emails[a] for a in approvers if user_emails.get(a)),
+            "\n".join(hr_manager_emails),
+        ))
+
+    updated = [field for field in ROUTE_FIELDS if field not in ("name", "creation", "owner")]
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        frappe.db.sql(f"""
+            INSERT INTO `tabEmployee Approver Route` ({", ".join(f"`{field}`" for field in ROUTE_FIELDS)})
+            VALUES {", ".join(["(" + ", ".join(["%s"] * len(ROUTE_FIELDS)) + ")"] * len(chunk))}
+            ON DUPLICATE KEY UPDATE {", ".join(f"`{field}` = VALUES(`{field}`)" for field in updated)}
+        """, [value for row in chunk for value in row])
+
+def _enqueue_rebuild(employees=None):
+    if employees is not None and not employees:
+        return
+    frappe.enqueue(
+        "psc_hrms.apis.approver_routing.rebuild_approver_routes",
+        queue="short",
+        job_id=REBUILD_ALL_JOB_ID if employees is None else None,
+        deduplicate=employees is None,
+        employees=employees,
+        enqueue_after_commit=True
+    )
+
+def on_employee_update(doc, method=None):
+    """
+    Employee on_update hook: rebuild this employee's route, and the routes of
+    everyone reporting to them when their own email changes.
+    """
+    if any(doc.has_value_changed(f) for f in ("department", "reports_to", "leave_approver")):
+        _enqueue_rebuild([doc.name])
+
+    if any(doc.has_value_changed(f) for f in ("prefered_email", "personal_email", "company_email")):
+        _enqueue_rebuild(frappe.get_all("Employee", filters={"reports_to": doc.name}, pluck="name"))
+
+def on_department_update(doc, method=None):
+    """
+    Department on_update hook: rebuild routes of the department's employees
+    when its leave approver table changes.
+    """
+    before = doc.get_doc_before_save()
+    old_approvers = [row.approver for row in before.get("leave_approvers", [])] if before else []
+    new_approvers = [row.approver for row in doc.get("leave_approvers", [])]
+    if old_approvers != new_approvers:
+        _enqueue_rebuild(frappe.get_all("Employee", filters={"department": doc.name}, pluck="name"))
+
+def on_user_update(doc, method=None):
+    """
+    User on_update hook (Has Role rows are saved through their User): HR Manager
+    and approver emails are spread over many routes, so rebuild all of them.
+    """
+    before = doc.get_doc_before_save()
+    is_hr = "HR Manager" in {r.role for r in doc.get("roles", [])}
+    if not before:
+        # A new user only shows up in routes as an HR Manager or a department approver
+        if is_hr or frappe.db.exists("Department Approver", {"approver": doc.name, "parenttype": "Department"}):
+            _enqueue_rebuild()
+        return
+
+    was_hr = "HR Manager" in {r.role for r in before.get("roles", [])}
+    if (
+        was_hr != is_hr
+        or (is_hr and doc.has_value_changed("enabled"))
+        or doc.has_value_changed("email")
+    ):
+        _enqueue_rebuild()
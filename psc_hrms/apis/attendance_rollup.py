@@ -0,0 +1,279 @@
+import frappe
+from frappe.utils import get_datetime, getdate, now_datetime
+
+# Rollup rows written per INSERT statement
+UPSERT_CHUNK_SIZE = 1000
+
+def rollup_name(employee, attendance_date):
+    return f"{employee}::{getdate(attendance_date).isoformat()}"
+
+def add_punches(punches):
+    """
+    Fold (employee, time, log_type, device_id) punches into their
+    employee-day rollup rows. A punch without a log_type only counts towards
+    punch_count and devices. Every column is updated with min/max/sum or a
+    set union, so the result does not depend on arrival order or batching.
+
+    Punches are summed per (employee, day, device) in Python and written with
+    a multi-row INSERT ... ON DUPLICATE KEY UPDATE; rows of the same day in
+    one statement are applied one after the other.
+    """
+    rows = {}
+    for employee, time, log_type, device_id in punches:
+        time = get_datetime(time)
+        seconds = time.hour * 3600 + time.minute * 60 + time.second
+        key = (employee, time.date(), device_id or "")
+        row = rows.setdefault(key, {
+            "first_in": None, "last_out": None, "punch_count": 0,
+            "in_count": 0, "out_count": 0, "sum_in_seconds": 0, "sum_out_seconds": 0,
+        })
+        row["punch_count"] += 1
+        if log_type == "IN":
+            row["in_count"] += 1
+            row["sum_in_seconds"] += seconds
+            row["first_in"] = min(row["first_in"] or time, time)
+        elif log_type == "OUT":
+            row["out_count"] += 1
+            row["sum_out_seconds"] += seconds
+            row["last_out"] = max(row["last_out"] or time, time)
+    if not rows:
+        return
+
+    now = now_datetime()
+    # Sorted, so concurrent writers lock rows in the same order
+    items = sorted(rows.items())
+    for start in range(0, len(items), UPSERT_CHUNK_SIZE):
+        values = []
+        params = []
+        for (employee, day, device_id), row in items[start:start + UPSERT_CHUNK_SIZE]:
+            values.append("(%s, %s, %s, %s, %s, 0, 0, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+            params.extend([
+                rollup_name(employee, day), now, now, frappe.session.user, frappe.session.user,
+                employee, day, row["first_in"], row["last_out"], row["punch_count"],
+                row["in_count"], row["out_count"], row["sum_in_seconds"], row["sum_out_seconds"], device_id,
+            ])
+
+        frappe.db.sql(f"""
+            INSERT INTO `tabDaily Attendance Rollup`
+                (name, creation, modified, owner, modified_by, docstatus, idx,
+                 employee, attendance_date, first_in, last_out, punch_count,
+                 in_count, out_count, sum_in_seconds, sum_out_seconds, devices)
+            VALUES {", ".join(values)}
+            ON DUPLICATE KEY UPDATE
+                first_in = LEAST(COALESCE(first_in, VALUES(first_in)), COALESCE(VALUES(first_in), first_in)),
+                last_out = GREATEST(COALESCE(last_out, VALUES(last_out)), COALESCE(VALUES(last_out), last_out)),
+                punch_count = punch_count + VALUES(punch_count),
+                in_count = in_count + VALUES(in_count),
+                out_count = out_count + VALUES(out_count),
+                sum_in_seconds = sum_in_seconds + VALUES(sum_in_seconds),
+                sum_out_seconds = sum_out_seconds + VALUES(sum_out_seconds),
+                devices = IF(
+                    VALUES(devices) = '' OR FIND_IN_SET(VALUES(devices), devices),
+                    devices,
+                    CONCAT_WS(',', NULLIF(devices, ''), VALUES(devices))
+                ),
+                modified = VALUES(modified)
+        """, params)
+
+    _set_worked_seconds({(employee, day) for employee, day, _device_id in rows})
+
+def _set_worked_seconds(keys):
+    frappe.db.sql("""
+        UPDATE `tabDaily Attendance Rollup`
+        SET worked_seconds = IF(
+            in_count = out_count AND in_count > 0,
+            sum_out_seconds - sum_in_seconds,
+            IF(first_in IS NOT NULL AND last_out > first_in, TIMESTAMPDIFF(SECOND, first_in, last_out), 0)
+        )
+        WHERE name IN %(names)s
+    """, {"names": [rollup_name(employee, day) for employee, day in keys]})
+
+def lock_attendance_days(keys):
+    """
+    Lock the rollup rows of (employee, attendance_date) keys until the
+    transaction ends, creating empty rows where needed, and return
+    {key: linked Attendance or None}.
+
+    Ingestion takes the rows of every employee-day in a chunk in this single
+    call, before writing anything, so two writers racing on the same
+    employee-day are serialised while writers on other days are not. Rows are
+    locked in name order to avoid deadlocks.
+    """
+    names = sorted({rollup_name(employee, day): (employee, getdate(day)) for employee, day in keys}.items())
+    if not names:
+        return {}
+
+    now = now_datetime()
+    values = []
+    params = []
+    for name, (employee, day) in names:
+        values.append("(%s, %s, %s, %s, %s, 0, 0, %s, %s)")
+        params.extend([name, now, now, frappe.session.user, frappe.session.user, employee, day])
+    frappe.db.sql(f"""
+        INSERT IGNORE INTO `tabDaily Attendance Rollup`
+            (name, creation, modified, owner, modified_by, docstatus, idx, employee, attendance_date)
+        VALUES {", ".join(values)}
+    """, params)
+
+    rows = frappe.db.sql("""
+        SELECT employee, attendance_date, attendance
+        FROM `tabDaily Attendance Rollup`
+        WHERE name IN %(names)s
+        ORDER BY name
+        FOR UPDATE
+    """, {"names": [name for name, _key in names]}, as_dict=True)
+    return {(row.employee, getdate(row.attendance_date)): row.attendance for row in rows}
+
+def set_rollup_attendance(employee, attendance_date, attendance):
+    now = now_datetime()
+    frappe.db.sql("""
+        INSERT INTO `tabDaily Attendance Rollup`
+            (name, creation, modified, owner, modified_by, docstatus, idx, employee, attendance_date, attendance)
+        VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0, %(employee)s, %(day)s, %(attendance)s)
+        ON DUPLICATE KEY UPDATE attendance = VALUES(attendance)
+    """, {
+        "name": rollup_name(employee, attendance_date), "now": now, "user": frappe.session.user,
+        "employee": employee, "day": getdate(attendance_date), "attendance": attendance,
+    })
+
+def on_attendance_submit(doc, method=None):
+    # Attendance from the desk or HRMS too: ingestion trusts the link it reads under the row lock
+    set_rollup_attendance(doc.employee, doc.attendance_date, doc.name)
+
+def on_attendance_cancel(doc, method=None):
+    """
+    Attendance on_cancel / on_trash hook: point the day's rollup row at another
+    submitted Attendance, or at nothing, so the next IN punch creates a new one.
+    """
+    frappe.db.sql("""
+        UPDATE `tabDaily Attendance Rollup`
+        SET attendance = (
+            SELECT att.name FROM `tabAttendance` att
+            WHERE att.employee = %(employee)s AND att.attendance_date = %(day)s
+                AND att.docstatus = 1 AND att.name != %(attendance)s
+            LIMIT 1
+        )
+        WHERE name = %(name)s AND attendance = %(attendance)s
+    """, {
+        "name": rollup_name(doc.employee, doc.attendance_date), "employee": doc.employee,
+        "day": getdate(doc.attendance_date), "attendance": doc.name,
+    })
+
+def get_rollups(keys, fields=("name", "employee", "attendance_date", "first_in", "last_out", "worked_seconds")):
+    """
+    Rollup rows for (employee, attendance_date) keys, in one query.
+    """
+    names = [rollup_name(employee, day) for employee, day in keys]
+    if not names:
+        return {}
+    rows = frappe.get_all("Daily Attendance Rollup", filters={"name": ["in", names]}, fields=list(fields))
+    return {(row.employee, getdate(row.attendance_date)): row for row in rows}
+
+def on_checkin_insert(doc, method=None):
+    # Checkins created through the desk or HRMS; ingestion bulk-inserts and calls add_punches itself
+    add_punches([(doc.employee, doc.time, doc.log_type, doc.device_id)])
+
+def on_checkin_update(doc, method=None):
+    # on_update also runs during insert, which after_insert already covers
+    if doc.flags.in_insert:
+        return
+    before = doc.get_doc_before_save()
+    fields = ("employee", "time", "log_type", "device_id")
+    if not before or all(before.get(field) == doc.get(field) for field in fields):
+        return
+    recompute_days([(before.employee, before.time), (doc.employee, doc.time)])
+
+def on_checkin_trash(doc, method=None):
+    # The checkin is still stored during on_trash
+    recompute_days([(doc.employee, doc.time)], exclude=doc.name)
+
+def recompute_days(keys, exclude=None):
+    """
+    Recompute the rollup rows of (employee, date or datetime) keys from
+    Employee Checkin, leaving out the checkin named `exclude`. Rows are reset
+    in place, so their Attendance link and row lock stay.
+    """
+    keys = {(employee, getdate(day)) for employee, day in keys if employee}
+    if not keys:
+        return
+
+    frappe.db.sql("""
+        UPDATE `tabDaily Attendance Rollup`
+        SET first_in = NULL, last_out = NULL, punch_count = 0, in_count = 0, out_count = 0,
+            sum_in_seconds = 0, sum_out_seconds = 0, worked_seconds = 0, devices = ''
+        WHERE name IN %(names)s
+    """, {"names": [rollup_name(employee, day) for employee, day in keys]})
+
+    punches = _get_punches(
+        "employee IN %(employees)s AND time >= %(from_date)s AND time < %(to_date)s + INTERVAL 1 DAY"
+        " AND name != %(exclude)s",
+        {
+            "employees": list({employee for employee, _day in keys}),
+            "from_date": min(day for _employee, day in keys),
+            "to_date": max(day for _employee, day in keys),
+            "exclude": exclude or "",
+        }
+    )
+    add_punches([punch for punch in punches if (punch[0], get_datetime(punch[1]).date()) in keys])
+
+def _get_punches(where, params):
+    return frappe.db.sql(f"""
+        SELECT employee, time, log_type, device_id
+        FROM `tabEmployee Checkin`
+        WHERE {where} AND employee IS NOT NULL
+    """, params)
+
+def rebuild_attendance_rollup(from_date=None, to_date=None):
+    """
+    Recompute the rollup rows of a date range (all dates by default) from
+    Employee Checkin.
+
+        bench --site <site> execute psc_hrms.apis.attendance_rollup.rebuild_attendance_rollup --kwargs "{'from_date': '2026-01-01'}"
+    """
+    conditions = []
+    params = {}
+    if from_date:
+        conditions.append("time >= %(from_date)s")
+        params["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("time < %(to_date)s + INTERVAL 1 DAY")
+        params["to_date"] = getdate(to_date)
+    where = " AND ".join(conditions) or "1 = 1"
+
+    day_filters = {}
+    if from_date and to_date:
+        day_filters["attendance_date"] = ["between", [getdate(from_date), getdate(to_date)]]
+    elif from_date:
+        day_filters["attendance_date"] = [">=", getdate(from_date)]
+    elif to_date:
+        day_filters["attendance_date"] = ["<=", getdate(to_date)]
+    frappe.db.delete("Daily Attendance Rollup", day_filters)
+
+    punches = _get_punches(where, params)
+    for start in range(0, len(punches), UPSERT_CHUNK_SIZE * 10):
+        add_punches(punches[start:start + UPSERT_CHUNK_SIZE * 10])
+    link_attendance(from_date, to_date)
+    frappe.db.commit()
+
+def link_attendance(from_date=None, to_date=None):
+    """
+    Point rollup rows at the submitted Attendance of their employee-day.
+    """
+    conditions = ""
+    params = {}
+    if from_date:
+        conditions += " AND rollup.attendance_date >= %(from_date)s"
+        params["from_date"] = getdate(from_date)
+    if to_date:
+        conditions += " AND rollup.attendance_date <= %(to_date)s"
+        params["to_date"] = getdate(to_date)
+
+    frappe.db.sql(f"""
+        UPDATE `tabDaily Attendance Rollup` rollup
+        JOIN `tabAttendance` att
+            ON att.employee = rollup.employee
+            AND att.attendance_date = rollup.attendance_date
+            AND att.docstatus = 1
+        SET rollup.attendance = att.name
+        WHERE 1 = 1 {conditions}
+    """, params)
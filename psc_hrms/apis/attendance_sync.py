@@ -1,134 +1,358 @@
 # Script to run on local server
-import requests
+import os
 import json
-from datetime import datetime
 import base64
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 
-# Configuration
-FRAPPE_SITE =  "parklands.techsavanna.technology"
-FRAPPE_API_KEY = "b1d5854640437ae"
-FRAPPE_API_SECRET = "e921c425ab4af71"
-COSEC_IP = "192.168.10.200"
-COSEC_USERNAME = "sa"
-COSEC_PASSWORD = "P@rkland$"
+import requests
+from requests.adapters import HTTPAdapter
 
-def main():
-    # today = datetime.now().strftime("%d%m%Y")
-    today = "15082025"
-    date_range = f"{today}-{today}"
-    frappe_auth = (FRAPPE_API_KEY, FRAPPE_API_SECRET)
-    
-    # Create Basic Auth header for COSEC
-    cosec_credentials = f"{COSEC_USERNAME}:{COSEC_PASSWORD}"
-    cosec_auth_header = {
-        "Authorization": f"Basic {base64.b64encode(cosec_credentials.encode()).decode()}"
-    }
+# Configuration (each value can be overridden from the environment)
+FRAPPE_SITE = os.environ.get("FRAPPE_SITE", "parklands.techsavanna.technology")
+FRAPPE_URL = os.environ.get("FRAPPE_URL", f"https://{FRAPPE_SITE}")
+FRAPPE_API_KEY = os.environ.get("FRAPPE_API_KEY", "b1d5854640437ae")
+FRAPPE_API_SECRET = os.environ.get("FRAPPE_API_SECRET", "e921c425ab4af71")
+COSEC_IP = os.environ.get("COSEC_IP", "192.168.10.200")
+COSEC_URL = os.environ.get("COSEC_URL", f"http://{COSEC_IP}")
+COSEC_USERNAME = os.environ.get("COSEC_USERNAME", "sa")
+COSEC_PASSWORD = os.environ.get("COSEC_PASSWORD", "P@rkland$")
+
+# Concurrency and batching
+FETCH_CONCURRENCY = int(os.environ.get("COSEC_FETCH_CONCURRENCY", 16))
+UPLOAD_CONCURRENCY = int(os.environ.get("FRAPPE_UPLOAD_CONCURRENCY", 4))
+UPLOAD_BATCH_SIZE = int(os.environ.get("FRAPPE_UPLOAD_BATCH_SIZE", 500))
+COSEC_TIMEOUT = 10
+FRAPPE_TIMEOUT = 120
 
-    # Get all employees
+# Per-employee high-water marks of the last uploaded COSEC event
+CHECKPOINT_FILE = os.environ.get(
+    "COSEC_CHECKPOINT_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cosec_sync_checkpoint.json")
+)
+# Events Frappe rejected, one JSON object per line, kept for replay once the cause is fixed
+FAILED_EVENTS_FILE = os.environ.get(
+    "COSEC_FAILED_EVENTS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cosec_sync_failed.jsonl")
+)
+
+STAFF_METHOD = "psc_hrms.apis.staff_attendance.get_staff"
+BULK_SYNC_METHOD = "psc_hrms.apis.staff_attendance.createAttendanceAndCheckinsBulk"
+
+EVENT_FIELDS = (
+    "index_no",
+    "user_id",
+    "user_name",
+    "event_date_time",
+    "entry_exit_type",
+    "master_controller_id",
+    "door_controller_id",
+    "special_function_id",
+    "leave_dt",
+    "i_date_time",
+)
+
+
+def make_session(pool_size, auth=None, headers=None):
+    """
+    Keep-alive session whose connection pool is sized to the number of
+    threads sharing it, so no request has to open a fresh TCP/TLS connection.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.auth = auth
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def fetch_staff(session):
     try:
-        staff_url = f"https://{FRAPPE_SITE}/api/method/psc_hrms.apis.staff_attendance.get_staff"
-        staff_res = requests.get(staff_url, auth=frappe_auth)
-        
+        staff_res = session.get(f"{FRAPPE_URL}/api/method/{STAFF_METHOD}", timeout=FRAPPE_TIMEOUT)
+
         if staff_res.status_code != 200:
             print(f"Staff fetch failed with status: {staff_res.status_code}")
-            return
-            
+            return None
+
         staff_data = staff_res.json().get("message", {})
         if "employees" not in staff_data:
             print("No employees found in response")
-            return
-            
-        employees = staff_data["employees"]
+            return None
+
+        return staff_data["employees"]
     except Exception as e:
         print(f"Staff fetch failed: {str(e)}")
-        return
+        return None
 
-    # Process each employee
-    for emp in employees:
-        emp_number = emp.get("employee_number")
-        if not emp_number:
-            print("Skipping employee with missing employee_number")
+
+def parse_events(emp_number, text_data):
+    """
+    Turn a COSEC event-ta response into payload dicts, skipping the header line.
+    """
+    lines = text_data.split("\n")
+    if len(lines) < 2:
+        print(f"Invalid data format for {emp_number}")
+        return []
+
+    events = []
+    for line in lines[1:]:
+        parts = line.strip().split("|")
+        if len(parts) < len(EVENT_FIELDS):
+            print(f"Skipping malformed line: {line}")
             continue
-        
-        clean_emp_number = emp_number.replace("-", "")
-        print(f"Original: {emp_number}, Cleaned: {clean_emp_number}")
-            
-        cosec_url = (
-            f"http://{COSEC_IP}/cosec/api.svc/v2/event-ta?"
-            f"action=get;date-range={date_range};range=user;Id={clean_emp_number}"
-        )
-        
+        events.append(dict(zip(EVENT_FIELDS, parts)))
+    return events
+
+
+def load_checkpoint():
+    """
+    Read the checkpoint file: {clean_emp_number: {"index_no": int, "event_date_time": str}}.
+    """
+    if not os.path.exists(CHECKPOINT_FILE):
+        return {}
+    try:
+        with open(CHECKPOINT_FILE) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable checkpoint {CHECKPOINT_FILE}: {str(e)}")
+        return {}
+
+
+def save_checkpoint(checkpoint):
+    """
+    Write the checkpoint atomically: a crash leaves either the old or the new file.
+    """
+    directory = os.path.dirname(CHECKPOINT_FILE) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cosec_checkpoint")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(checkpoint, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CHECKPOINT_FILE)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def event_key(event):
+    """
+    Sort key of an event: its timestamp first (index_no can roll over on the
+    controller), then its COSEC index_no.
+    """
+    try:
+        event_dt = datetime.strptime(event["event_date_time"], "%d/%m/%Y %H:%M:%S")
+    except (KeyError, ValueError):
+        event_dt = datetime.min
+    try:
+        index_no = int(event["index_no"])
+    except (KeyError, ValueError):
+        index_no = -1
+    return event_dt, index_no
+
+
+def is_new_event(event, mark):
+    if not mark:
+        return True
+    return event_key(event) > event_key(mark)
+
+
+def get_date_range(mark, today):
+    """
+    Only ask COSEC for the days since the last uploaded event.
+    """
+    start = today
+    if mark:
+        mark_dt, _index = event_key(mark)
+        if mark_dt != datetime.min and mark_dt.date() < today.date():
+            start = mark_dt
+    return f"{start.strftime('%d%m%Y')}-{today.strftime('%d%m%Y')}"
+
+
+def advance_checkpoint(checkpoint, uploads):
+    """
+    Move each employee's mark to its newest settled event, stopping at the
+    first one that may succeed on a retry (its batch failed, or Frappe flagged
+    the error `retryable`) so it is fetched again on the next run.
+    Validation errors are terminal: retrying returns the same error, so they
+    are recorded by record_failures and the mark moves past them.
+    """
+    per_employee = {}
+    for batch, results in uploads:
+        results = results or [None] * len(batch)
+        for event, result in zip(batch, results):
+            per_employee.setdefault(event["user_id"].replace("-", ""), []).append((event, is_settled(result)))
+
+    for clean_emp_number, events in per_employee.items():
+        for event, settled in sorted(events, key=lambda item: event_key(item[0])):
+            if not settled:
+                break
+            checkpoint[clean_emp_number] = {
+                "index_no": event["index_no"],
+                "event_date_time": event["event_date_time"],
+            }
+    return checkpoint
+
+
+def is_settled(result):
+    return result is not None and (result.get("success") or not result.get("retryable"))
+
+
+def record_failures(uploads):
+    """
+    Append the events Frappe rejected for good to FAILED_EVENTS_FILE.
+    """
+    failures = [
+        {"event": event, "error": result.get("error", "Unknown error")}
+        for batch, results in uploads if results is not None
+        for event, result in zip(batch, results) if not result.get("success") and is_settled(result)
+    ]
+    if failures:
+        with open(FAILED_EVENTS_FILE, "a") as f:
+            for failure in failures:
+                f.write(json.dumps(failure) + "\n")
+    return len(failures)
+
+
+def fetch_events(session, emp_number, mark, today):
+    """
+    Fetch one employee's punches newer than `mark` from COSEC. Errors are
+    reported and yield no events.
+    """
+    clean_emp_number = emp_number.replace("-", "")
+    date_range = get_date_range(mark, today)
+    cosec_url = (
+        f"{COSEC_URL}/cosec/api.svc/v2/event-ta?"
+        f"action=get;date-range={date_range};range=user;Id={clean_emp_number}"
+    )
+
+    try:
+        cosec_res = session.get(cosec_url, timeout=COSEC_TIMEOUT)
+
+        if cosec_res.status_code != 200:
+            print(f"COSEC API failed for {emp_number}: Status {cosec_res.status_code}")
+            return []
+
+        text_data = cosec_res.text.strip()
+        if not text_data:
+            return []
+
+        return [event for event in parse_events(emp_number, text_data) if is_new_event(event, mark)]
+    except Exception as e:
+        print(f"Error processing {clean_emp_number}: {str(e)}")
+        return []
+
+
+class BatchUploader:
+    """
+    Buffers parsed events and posts them to the bulk endpoint in batches of
+    UPLOAD_BATCH_SIZE on a small thread pool, so uploads overlap with fetching.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.pool = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY)
+        self.buffer = []
+        self.futures = []
+
+    def add(self, events):
+        self.buffer.extend(events)
+        while len(self.buffer) >= UPLOAD_BATCH_SIZE:
+            batch, self.buffer = self.buffer[:UPLOAD_BATCH_SIZE], self.buffer[UPLOAD_BATCH_SIZE:]
+            self.futures.append(self.pool.submit(self.upload, batch))
+
+    def close(self):
+        """
+        Flush the remaining buffer, wait for all uploads and return
+        (batch, results) pairs; results is None for a failed batch.
+        """
+        if self.buffer:
+            self.futures.append(self.pool.submit(self.upload, self.buffer))
+            self.buffer = []
+        uploads = [future.result() for future in self.futures]
+        self.pool.shutdown()
+        return uploads
+
+    def upload(self, batch):
         try:
-            # Make request to COSEC API with Basic Auth
-            cosec_res = requests.get(
-                cosec_url, 
-                headers=cosec_auth_header,
-                timeout=10
+            response = self.session.post(
+                f"{FRAPPE_URL}/api/method/{BULK_SYNC_METHOD}",
+                json={"events": batch},
+                timeout=FRAPPE_TIMEOUT
             )
-            
-            if cosec_res.status_code != 200:
-                print(f"COSEC API failed for {emp_number}: Status {cosec_res.status_code}")
-                continue
-                
-            # Process response text
-            text_data = cosec_res.text.strip()
-            if not text_data:
-                print(f"No data for employee {emp_number}")
-                continue
-                
-            lines = text_data.split("\n")
-            if len(lines) < 2:
-                print(f"Invalid data format for {emp_number}")
-                continue
-                
-            # Process each attendance record
-            for line in lines[1:]:
-                parts = line.split("|")
-                if len(parts) < 10:
-                    print(f"Skipping malformed line: {line}")
-                    continue
-                    
-                payload = {
-                    "index_no": parts[0],
-                    "user_id": parts[1],
-                    "user_name": parts[2],
-                    "event_date_time": parts[3],
-                    "entry_exit_type": parts[4],
-                    "master_controller_id": parts[5],
-                    "door_controller_id": parts[6],
-                    "special_function_id": parts[7],
-                    "leave_dt": parts[8],
-                    "i_date_time": parts[9]
-                }
-                
-                # Sync with Frappe
-                try:
-                    sync_url = f"https://{FRAPPE_SITE}/api/method/psc_hrms.apis.staff_attendance.createAttendanceAndCheckins"
-                    response = requests.post(
-                        sync_url, 
-                        data={"data": json.dumps(payload)}, 
-                        auth=frappe_auth,
-                        headers={"Content-Type": "application/x-www-form-urlencoded"}
-                    )
-                    print(f"API Response: {response.text}")  
-                    if response.status_code == 200:
-                        result = response.json().get("message", {})
-                        if result.get("success"):
-                            print(f"Successfully processed record {parts[0]} for {clean_emp_number}")
-                        else:
-                            print(f"API reported failure: {result.get('error', 'Unknown error')}")
-                    else:
-                        print(f"Frappe API failed for record {parts[0]}: Status {response.status_code}")
-                        print(f"Response: {response.text}")
-                        
-                except Exception as e:
-                    print(f"Frappe sync failed for {clean_emp_number}: {str(e)}")
-                
+            if response.status_code != 200:
+                print(f"Frappe API failed for batch of {len(batch)}: Status {response.status_code}")
+                print(f"Response: {response.text}")
+                return batch, None
+
+            result = response.json().get("message", {})
+            if not result.get("success"):
+                print(f"API reported failure: {result.get('error', 'Unknown error')}")
+                return batch, None
+
+            return batch, result["results"]
         except Exception as e:
-            print(f"Error processing {clean_emp_number}: {str(e)}")
+            print(f"Frappe sync failed for batch of {len(batch)}: {str(e)}")
+            return batch, None
 
-if __name__ == "__main__":
-    main()
 
+def main():
+    """
+    Upload COSEC punches that are newer than the stored checkpoint, then
+    advance it. Cheap enough to run every couple of minutes.
+    """
+    today = datetime.now()
+    checkpoint = load_checkpoint()
+
+    # Create Basic Auth header for COSEC
+    cosec_credentials = f"{COSEC_USERNAME}:{COSEC_PASSWORD}"
+    cosec_auth_header = {
+        "Authorization": f"Basic {base64.b64encode(cosec_credentials.encode()).decode()}"
+    }
+
+    frappe_session = make_session(UPLOAD_CONCURRENCY, auth=(FRAPPE_API_KEY, FRAPPE_API_SECRET))
+    cosec_session = make_session(FETCH_CONCURRENCY, headers=cosec_auth_header)
+
+    employees = fetch_staff(frappe_session)
+    if not employees:
+        return
+
+    emp_numbers = [emp.get("employee_number") for emp in employees]
+    if None in emp_numbers or "" in emp_numbers:
+        print("Skipping employees with missing employee_number")
+    emp_numbers = [number for number in emp_numbers if number]
+
+    # Fetch all ranges concurrently and hand events to the uploader as they arrive
+    uploader = BatchUploader(frappe_session)
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as pool:
+        futures = [
+            pool.submit(fetch_events, cosec_session, number, checkpoint.get(number.replace("-", "")), today)
+            for number in emp_numbers
+        ]
+        for future in as_completed(futures):
+            uploader.add(future.result())
+
+    uploads = uploader.close()
+    record_failures(uploads)
+    save_checkpoint(advance_checkpoint(checkpoint, uploads))
+
+    synced = failed = 0
+    for batch, results in uploads:
+        if results is None:
+            failed += len(batch)
+            continue
+        for result in results:
+            if result.get("success"):
+                synced += 1
+            else:
+                failed += 1
+                print(f"Record {result.get('index_no')} failed: {result.get('error', 'Unknown error')}")
+
+    print(f"Sync complete: {synced} record(s) processed, {failed} failed")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import frappe
+from frappe import _
+from frappe.model.workflow import apply_workflow
+from frappe.utils import flt, now_datetime
+
+from psc_hrms.psc_hrms.doctype.public_holiday_and_off_days_claim_form.public_holiday_and_off_days_claim_form import (
+    create_claim_allocation,
+)
+
+CLAIM_DOCTYPE = "Public Holiday and Off Days Claim Form"
+
+# Claims transitioned per transaction by the bulk job
+CLAIM_CHUNK_SIZE = 50
+CLAIM_PROGRESS_EVENT = "psc_hrms_bulk_claim_progress"
+# The failure report is kept this long for get_bulk_claim_status
+CLAIM_REPORT_TTL = 24 * 60 * 60
+
+def _report_key(batch_id):
+    return f"psc_hrms:bulk_claim_action:{batch_id}"
+
+@frappe.whitelist()
+def bulk_apply_claim_action(names, action):
+    """
+    Apply a workflow action (e.g. "Approve") to many claim forms in a
+    background job. Progress is published on the
+    `psc_hrms_bulk_claim_progress` realtime event; the final report is also
+    available from get_bulk_claim_status.
+    """
+    names = frappe.parse_json(names)
+    if not names:
+        frappe.throw(_("Select at least one claim form"))
+    if not frappe.has_permission(CLAIM_DOCTYPE, "write"):
+        frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+    batch_id = frappe.generate_hash(length=10)
+    frappe.enqueue(
+        "psc_hrms.apis.claim_workflow.process_bulk_claim_action",
+        queue="long",
+        timeout=3600,
+        enqueue_after_commit=True,
+        batch_id=batch_id,
+        names=names,
+        action=action,
+        user=frappe.session.user
+    )
+    return {"batch_id": batch_id, "claims": len(names)}
+
+@frappe.whitelist()
+def get_bulk_claim_status(batch_id):
+    return frappe.cache().get_value(_report_key(batch_id))
+
+def process_bulk_claim_action(batch_id, names, action, user):
+    """
+    Background job: transition the claims CLAIM_CHUNK_SIZE at a time, one
+    transaction per chunk. Claims reaching "Approved by HRM" get one Leave
+    Allocation per employee and chunk instead of one per claim; workflow
+    emails are sent by a single job after each commit.
+    """
+    frappe.set_user(user)
+
+    # Sorted by employee so each employee's claims tend to share a chunk (and an allocation)
+    claims = frappe.get_all(
+        CLAIM_DOCTYPE,
+        filters={"name": ["in", names]},
+        order_by="for_staff asc, name asc",
+        pluck="name"
+    )
+    report = {"batch_id": batch_id, "action": action, "total": len(names), "done": 0, "succeeded": 0, "failed": []}
+    missing = set(names) - set(claims)
+    report["failed"].extend({"name": name, "error": _("Not found")} for name in missing)
+
+    for start in range(0, len(claims), CLAIM_CHUNK_SIZE):
+        chunk = claims[start:start + CLAIM_CHUNK_SIZE]
+        try:
+            succeeded, failed = _process_claim_chunk(chunk, action)
+            frappe.db.commit()
+            report["succeeded"] += succeeded
+            report["failed"].extend(failed)
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Bulk claim action {batch_id} failed: {e}")
+            report["failed"].extend({"name": name, "error": str(e)} for name in chunk)
+
+        report["done"] = len(missing) + min(start + CLAIM_CHUNK_SIZE, len(claims))
+        frappe.publish_realtime(CLAIM_PROGRESS_EVENT, report, user=user)
+
+    report["done"] = report["total"]
+    report["finished"] = True
+    frappe.cache().set_value(_report_key(batch_id), report, expires_in_sec=CLAIM_REPORT_TTL)
+    frappe.publish_realtime(CLAIM_PROGRESS_EVENT, report, user=user)
+
+def _process_claim_chunk(chunk, action):
+    """
+    Apply the action to each claim of a chunk, rolling a failing claim back
+    to its savepoint. Returns (number succeeded, failure rows).
+    """
+    succeeded = 0
+    failed = []
+    frappe.flags.in_bulk_claim_approval = True
+    frappe.flags.bulk_claim_approved = []
+    try:
+        for name in chunk:
+            frappe.db.savepoint("bulk_claim")
+            try:
+                apply_workflow(frappe.get_doc(CLAIM_DOCTYPE, name), action)
+                succeeded += 1
+            except Exception as e:
+                frappe.db.rollback(save_point="bulk_claim")
+                frappe.clear_last_message()
+                # Drop the email buffered for the transition that was rolled back
+                frappe.local.flags.get("psc_pending_notifications", {}).pop((CLAIM_DOCTYPE, name), None)
+                failed.append({"name": name, "error": str(e)})
+        failed_names = {row["name"] for row in failed}
+        approved = [doc for doc in frappe.flags.bulk_claim_approved if doc.name not in failed_names]
+    finally:
+        frappe.flags.in_bulk_claim_approval = False
+        frappe.flags.bulk_claim_approved = []
+
+    failed.extend(_allocate_approved_claims(approved))
+    return succeeded, failed
+
+def _allocate_approved_claims(approved):
+    """
+    One Leave Allocation per employee for the claims approved in a chunk.
+    Returns failure rows for claims left without an allocation.
+    """
+    failed = []
+    per_employee = {}
+    for doc in approved:
+        per_employee.setdefault((doc.for_staff, doc.department), []).append(doc)
+
+    now = now_datetime()
+    for (employee, department), docs in per_employee.items():
+        names = [doc.name for doc in docs]
+        new_leaves = sum(flt(doc.eligible_day_count) for doc in docs)
+        if not new_leaves:
+            failed.extend({"name": name, "error": _("No eligible days to allocate")} for name in names)
+            continue
+
+        frappe.db.savepoint("bulk_claim_allocation")
+        try:
+            alloc_name = create_claim_allocation(employee, department, new_leaves)
+        except Exception as e:
+            # As with a single approval, the claims stay approved without an allocation
+            frappe.db.rollback(save_point="bulk_claim_allocation")
+            frappe.log_error(_("Error creating Leave Allocation: {0}").format(str(e)))
+            failed.extend(
+                {"name": name, "error": _("Approved, but Leave Allocation failed: {0}").format(str(e))}
+                for name in names
+            )
+            continue
+
+        frappe.db.set_value(
+            CLAIM_DOCTYPE,
+            {"name": ["in", names]},
+            {"leave_allocation": alloc_name, "approved_on": now},
+            update_modified=False
+        )
+
+    return failed
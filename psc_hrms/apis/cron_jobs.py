@@ -4,7 +4,17 @@ import frappe
 from frappe.utils import getdate, nowdate, flt
 from datetime import timedelta, date
 import calendar
+import zlib
+from psc_hrms.apis.instrumentation import instrument
 
+# Leave Allocations inserted and submitted per transaction
+ACCRUAL_CHUNK_SIZE = 100
+# Background jobs the month-end accrual is split into (by employee hash)
+ACCRUAL_SHARDS = 8
+ACCRUAL_RUN_KEY = "psc_hrms:leave_accrual:{0}"
+ACCRUAL_COUNTERS = ("shards", "done", "created", "failed", "failed_shards")
+
+@instrument()
 def set_leave_days():
     """Called monthly via scheduler_events. On the last day of each month,
     allocate one-twelfth of each leave policy's annual allocation to all
@@ -16,211 +26,444 @@ def set_leave_days():
     if today.day != last_day:
         return
 
-    current_year = today.year
+    enqueue_leave_accrual(today)
 
-    # 1. fetch all Leave Policies for this calendar year
-    policies = frappe.get_all(
-        "Leave Policy",
-        filters={"custom_policy_for_year": current_year},
-        fields=["name"]
-    )
+def enqueue_leave_accrual(today, shard_count=ACCRUAL_SHARDS, force=False):
+    """
+    Split the accrual into `shard_count` employee-hash shards, each run as an
+    independent job on the long queue. Progress and totals are tracked in
+    Redis counters that get_leave_accrual_status reads. While a run for the
+    same day is still in progress nothing is enqueued and None is returned:
+    resetting its counters would corrupt the totals of the shards still running.
+    `force` starts over anyway, e.g. after a shard job was killed before counting itself done.
+    """
+    run_id = getdate(today).isoformat()
+    key = frappe.cache().make_key(ACCRUAL_RUN_KEY.format(run_id))
+    shards, done = frappe.cache().hmget(key, ("shards", "done"))
+    if not force and shards is not None and int(done or 0) < int(shards):
+        frappe.logger("psc_hrms").info(f"set_leave_days {run_id}: run still in progress, not enqueued again")
+        return None
+
+    frappe.cache().delete(key)
+    frappe.cache().hmset(key, {counter: 0 for counter in ACCRUAL_COUNTERS} | {"shards": shard_count})
+    frappe.cache().expire(key, 7 * 24 * 60 * 60)
+
+    for shard in range(shard_count):
+        frappe.enqueue(
+            "psc_hrms.apis.cron_jobs.accrue_leave_shard",
+            queue="long",
+            timeout=3600,
+            job_id=f"psc_hrms_leave_accrual::{run_id}::{shard}",
+            deduplicate=True,
+            run_id=run_id,
+            shard=shard,
+            shard_count=shard_count
+        )
+    return run_id
+
+@instrument()
+def accrue_leave_shard(run_id, shard, shard_count):
+    """
+    Background job for one accrual shard. The last shard to finish logs the run totals.
+    """
+    result = {"created": 0, "failed": 0}
+    shard_failed = 0
+    try:
+        result = run_leave_accrual(getdate(run_id), shard=shard, shard_count=shard_count)
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Leave accrual shard {shard}/{shard_count} of {run_id} failed: {e}")
+        shard_failed = 1
+
+    # Plain Redis counters: HINCRBY keeps concurrent shards from losing updates
+    cache = frappe.cache()
+    key = cache.make_key(ACCRUAL_RUN_KEY.format(run_id))
+    cache.hincrby(key, "created", result["created"])
+    cache.hincrby(key, "failed", result["failed"])
+    cache.hincrby(key, "failed_shards", shard_failed)
+    if cache.hincrby(key, "done", 1) == shard_count:
+        frappe.logger("psc_hrms").info(f"set_leave_days {run_id}: {get_leave_accrual_status(run_id)}")
+
+@frappe.whitelist()
+def get_leave_accrual_status(run_id):
+    """
+    Progress and totals of a sharded accrual run (run_id is the run date).
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+
+    key = frappe.cache().make_key(ACCRUAL_RUN_KEY.format(run_id))
+    values = frappe.cache().hmget(key, ACCRUAL_COUNTERS)
+    if values[0] is None:
+        return {}
 
-    # compute next month start/end
+    status = {counter: int(value or 0) for counter, value in zip(ACCRUAL_COUNTERS, values)}
+    status["complete"] = status["done"] >= status["shards"]
+    return status
+
+def run_leave_accrual(today, policies=None, shard=0, shard_count=1):
+    """
+    Accrue next month's leave for every active assignment of this year's
+    policies (or only `policies`). Inputs are prefetched in a handful of grouped
+    queries and allocations are written in chunks of ACCRUAL_CHUNK_SIZE, each
+    committed on its own. Allocations already created for next month are
+    skipped, so a run that died halfway can simply be started again.
+    With `shard_count` > 1 only employees hashing to `shard` are accrued.
+    """
+    # compute next month start
     # trick: move to day 28 + 4 days -> always next month, then force day=1
     nxt = today.replace(day=28) + timedelta(days=4)
     next_start = nxt.replace(day=1)
-    next_end = next_start.replace(day=calendar.monthrange(next_start.year, next_start.month)[1])
-
-    for p in policies:
-        # 2. child table entries: leave_type & annual_allocation
-        details = frappe.get_all(
-            "Leave Policy Detail",
-            filters=[
-                ["parent", "=", p.name],
-                ["leave_type", "!=", "Sick Leave"]
-            ],
-            fields=["leave_type", "annual_allocation"]
-        )
 
-        # 3. all assignments under this policy
-        assignments = frappe.get_all(
-            "Leave Policy Assignment",
-            filters={"leave_policy": p.name},
-            fields=["name", "employee", "company", "effective_from", "effective_to"]
-        )
+    accruals = _plan_leave_accruals(today, next_start, policies, shard, shard_count)
+    return _write_leave_accruals(accruals)
 
-        for a in assignments:
-            eff_from = getdate(a.effective_from)
-            eff_to   = getdate(a.effective_to)
-            # only active assignments
-            if not (eff_from <= today <= eff_to):
-                continue
-
-            for d in details:
-                # per-month allocation
-                monthly_alloc = flt(d.annual_allocation) / 12.0
-
-                # sum up existing non-expired allocations for this assignment & type
-                existing = frappe.get_all(
-                    "Leave Allocation",
-                    filters={
-                        "leave_policy_assignment": a.name,
-                        "leave_type": d.leave_type,
-                        "expired": 0
-                    },
-                    fields=["total_leaves_allocated"]
-                )
-                total_prev = sum(flt(e.total_leaves_allocated) for e in existing)
-
-                # build & insert new Leave Allocation
-                new_total = total_prev + monthly_alloc
+def _plan_leave_accruals(today, next_start, policies=None, shard=0, shard_count=1):
+    """
+    Build the list of Leave Allocations to create for next month.
+    """
+    # 1. Leave Policies for this calendar year
+    policy_filters = {"custom_policy_for_year": today.year}
+    if policies is not None:
+        policy_filters["name"] = ["in", policies]
+    policies = frappe.get_all("Leave Policy", filters=policy_filters, pluck="name")
+    if not policies:
+        return []
+
+    # 2. child table entries: leave_type & annual_allocation, per policy
+    details = {}
+    for d in frappe.get_all(
+        "Leave Policy Detail",
+        filters=[
+            ["parent", "in", policies],
+            ["leave_type", "!=", "Sick Leave"]
+        ],
+        fields=["parent", "leave_type", "annual_allocation"]
+    ):
+        details.setdefault(d.parent, []).append(d)
+
+    # 3. active assignments under these policies
+    assignments = frappe.get_all(
+        "Leave Policy Assignment",
+        filters=[
+            ["leave_policy", "in", policies],
+            ["effective_from", "<=", today],
+            ["effective_to", ">=", today]
+        ],
+        fields=["name", "employee", "company", "effective_from", "effective_to", "leave_policy"]
+    )
+    if shard_count > 1:
+        assignments = [a for a in assignments if zlib.crc32(a.employee.encode()) % shard_count == shard]
+    if not assignments:
+        return []
+    assignment_names = [a.name for a in assignments]
+
+    # 4. existing non-expired totals per assignment & type, and what this run already wrote
+    totals = {}
+    already_accrued = set()
+    for e in frappe.get_all(
+        "Leave Allocation",
+        filters={"leave_policy_assignment": ["in", assignment_names], "expired": 0},
+        fields=[
+            "leave_policy_assignment", "leave_type",
+            "sum(total_leaves_allocated) as total_allocated",
+            "max(from_date) as last_from_date"
+        ],
+        group_by="leave_policy_assignment, leave_type"
+    ):
+        totals[(e.leave_policy_assignment, e.leave_type)] = flt(e.total_allocated)
+        if e.last_from_date and getdate(e.last_from_date) >= next_start:
+            already_accrued.add((e.leave_policy_assignment, e.leave_type))
+
+    return [
+        frappe._dict({
+            "employee": a.employee,
+            "company": a.company,
+            "leave_type": d.leave_type,
+            "from_date": next_start,
+            "to_date": getdate(a.effective_to),
+            "new_leaves_allocated": flt(d.annual_allocation) / 12.0,
+            "total_leaves_allocated": totals.get((a.name, d.leave_type), 0) + flt(d.annual_allocation) / 12.0,
+            "leave_policy": a.leave_policy,
+            "leave_policy_assignment": a.name
+        })
+        for a in assignments
+        for d in details.get(a.leave_policy, [])
+        if (a.name, d.leave_type) not in already_accrued
+    ]
+
+def _write_leave_accruals(accruals):
+    """
+    Insert and submit the planned allocations, committing every chunk. A failed
+    chunk is rolled back and logged; the next run picks it up again.
+    """
+    created = failed = 0
+    for start in range(0, len(accruals), ACCRUAL_CHUNK_SIZE):
+        chunk = accruals[start:start + ACCRUAL_CHUNK_SIZE]
+        try:
+            for accrual in chunk:
                 alloc_doc = frappe.get_doc({
                     "doctype": "Leave Allocation",
-                    "employee": a.employee,
-                    "company": a.company,
-                    "leave_type": d.leave_type,
-                    "from_date": next_start,
-                    "to_date": eff_to,
-                    "new_leaves_allocated": monthly_alloc,
                     "carry_forward": 1,
-                    "total_leaves_allocated": new_total,
-                    "leave_policy": p.name,
-                    "leave_policy_assignment": a.name
+                    **accrual
                 })
                 alloc_doc.insert(ignore_permissions=True)
                 alloc_doc.submit()
+            frappe.db.commit()
+            created += len(chunk)
+        except Exception as e:
+            frappe.db.rollback()
+            failed += len(chunk)
+            frappe.log_error(f"Error accruing leave for {chunk[0].leave_policy_assignment}: {e}")
+
+    frappe.logger("psc_hrms").info(f"set_leave_days: {created} allocations created, {failed} failed")
+    return {"created": created, "failed": failed}
 
+import time
 import frappe
+from frappe.utils import now_datetime
+
+# Doctypes whose User Permissions are managed by set_user_permissions
+MANAGED_PERMISSION_DOCTYPES = ["Employee", "Company", "Leave Application"]
 
-def set_user_permissions():
+USER_PERMISSION_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "user", "allow", "for_value", "apply_to_all_doctypes", "is_default", "custom_psc_managed",
+)
+
+@instrument()
+def set_user_permissions(prune=False, employees=None):
     """
-    Cron job to sync User Permissions for Employees:
+    Nightly reconciliation of User Permissions for Employees (changes are
+    normally applied right away by sync_user_permissions, see the hooks below):
       0. For each Employee, create default permission for their own Employee record
-      1. For each distinct leave_approver on Employee, grant permission on Employee to that approver.
+      1. For each distinct leave_approver on Employee, grant permission on Leave Application to that approver.
       2. For each Employee by department, fetch Department Approver entries and grant permission on Employee to each.
-    Avoids duplicates by checking existing User Permission docs.
+    The desired and existing permission sets are loaded in bulk, diffed in memory
+    and only the missing rows are inserted, in a single transaction. An existing
+    row that should become the default is updated in place.
+    With `prune`, rows this sync created (custom_psc_managed) that are no longer
+    desired are deleted; permissions added by hand are left alone.
+    `employees` limits the sync to permissions on those Employee records.
     """
-    # Part 0: Create default Employee permissions for all Employees
-    employees = frappe.get_all(
-        "Employee",
-        fields=["name", "user_id", "company"],
-        filters={"user_id": ["!=", ""]}
-    )
-    
-    for emp in employees:
-        # Create Employee permission
-        _create_permission(
-            user=emp.user_id,
-            allow="Employee",
-            for_value=emp.name,
-            apply_to_all_doctypes=1,
-            is_default=1
+    started = time.monotonic()
+
+    try:
+        desired = _get_desired_permissions(employees)
+        existing = _get_existing_permissions(
+            employees,
+            users=[key[0] for key in desired if key[1] == "Company"]
         )
-        
-        # Create Company permission if company exists
-        if emp.company:
-            _create_permission(
-                user=emp.user_id,
-                allow="Company",
-                for_value=emp.company,
-                apply_to_all_doctypes=1
-            )
 
-    # Part 1: Permissions for direct leave_approver (non-empty)
+        to_insert = []
+        to_default = []
+        for key, is_default in desired.items():
+            current = existing.get(key)
+            if current is None:
+                to_insert.append((key, is_default))
+            elif is_default and not current.is_default:
+                to_default.append(current.name)
+
+        stale = []
+        if prune:
+            stale = [perm.name for key, perm in existing.items() if key not in desired and perm.custom_psc_managed]
+
+        _apply_permission_diff(to_insert, to_default, stale, existing, desired)
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Error syncing User Permissions: {e}")
+        return
+
+    frappe.logger("psc_hrms").info(
+        f"set_user_permissions({len(employees) if employees else 'all'}): {len(desired)} desired, {len(to_insert)} inserted, "
+        f"{len(to_default)} set default, {len(stale)} deleted in {time.monotonic() - started:.2f}s"
+    )
+
+def _get_desired_permissions(employee_names=None):
+    """
+    {(user, allow, for_value, apply_to_all_doctypes): is_default} built from
+    two bulk queries.
+    """
+    desired = {}
+    defaults = {}
+
+    def add(user, allow, for_value, apply_to_all_doctypes=1, is_default=0):
+        if not user or not for_value:
+            return
+        # UserPermission.validate allows one default per user and doctype; the first one wins
+        if is_default and defaults.setdefault((user, allow), for_value) != for_value:
+            is_default = 0
+        key = (user, allow, for_value, apply_to_all_doctypes)
+        desired[key] = max(desired.get(key, 0), is_default)
+
     employees = frappe.get_all(
         "Employee",
-        fields=["name", "leave_approver"],
-        filters={"leave_approver": ["!=", ""]}
+        filters={"name": ["in", employee_names]} if employee_names is not None else None,
+        fields=["name", "user_id", "company", "leave_approver", "department"],
+        order_by="name asc"
     )
 
-    # Group by leave_approver
-    approver_map = {}
+    approver_filters = {"parentfield": "leave_approvers", "parenttype": "Department"}
+    if employee_names is not None:
+        approver_filters["parent"] = ["in", list({emp.department for emp in employees if emp.department}) or [""]]
+
+    dept_approvers = {}
+    for row in frappe.get_all(
+        "Department Approver",
+        filters=approver_filters,
+        fields=["parent", "approver"]
+    ):
+        if row.approver:
+            dept_approvers.setdefault(row.parent, set()).add(row.approver)
+
     for emp in employees:
-        approver = emp.leave_approver
-        approver_map.setdefault(approver, []).append(emp.name)
-
-    for approver, emp_list in approver_map.items():
-        for emp_name in emp_list:
-            _create_permission(
-                user=approver,
-                allow="Leave Application",
-                for_value=emp_name,
-                apply_to_all_doctypes=1
+        # Part 0: own Employee record (default) and Company
+        if emp.user_id:
+            add(emp.user_id, "Employee", emp.name, is_default=1)
+            add(emp.user_id, "Company", emp.company)
+
+        # Part 1: direct leave_approver
+        add(emp.leave_approver, "Leave Application", emp.name)
+
+        # Part 2: department-level approvers
+        for approver in dept_approvers.get(emp.department, ()):
+            add(approver, "Employee", emp.name)
+
+    if employee_names is not None:
+        # A scoped, pruning sync reads these users' Company rows, so keep those their other Employees need
+        users = [emp.user_id for emp in employees if emp.user_id]
+        for emp in frappe.get_all(
+            "Employee",
+            filters={"user_id": ["in", users or [""]], "name": ["not in", employee_names or [""]]},
+            fields=["user_id", "company"]
+        ):
+            add(emp.user_id, "Company", emp.company)
+
+    return desired
+
+def _get_existing_permissions(employee_names=None, users=None):
+    """
+    Existing User Permissions of the managed doctypes, keyed like the desired set.
+    When scoped to `employee_names`, Company permissions are read for `users`.
+    """
+    fields = ["name", "user", "allow", "for_value", "apply_to_all_doctypes", "is_default", "custom_psc_managed"]
+    if employee_names is None:
+        perms = frappe.get_all(
+            "User Permission",
+            filters={"allow": ["in", MANAGED_PERMISSION_DOCTYPES]},
+            fields=fields
+        )
+    else:
+        perms = frappe.get_all(
+            "User Permission",
+            filters={"allow": ["in", ["Employee", "Leave Application"]], "for_value": ["in", employee_names]},
+            fields=fields
+        )
+        if users:
+            perms += frappe.get_all(
+                "User Permission",
+                filters={"allow": "Company", "user": ["in", users]},
+                fields=fields
             )
 
-    # Part 2: Permissions for department-level approvers
-    # Fetch distinct non-empty departments
-    departments = frappe.get_all(
-        "Employee",
-        filters={"department": ["!=", ""]},
-        fields=["department"],
-        distinct=True
-    )
+    existing = {}
+    for perm in perms:
+        key = (perm.user, perm.allow, perm.for_value, perm.apply_to_all_doctypes)
+        if key not in existing or perm.is_default:
+            existing[key] = perm
+    return existing
 
-    for d in departments:
-        dept = d.department
-        # Get approvers from Department Approver child table
-        approver_rows = frappe.get_all(
-            "Department Approver",
-            fields=["approver"],
+def _apply_permission_diff(to_insert, to_default, stale, existing, desired):
+    now = now_datetime()
+    affected_users = _demote_other_defaults(desired)
+
+    rows = []
+    for (user, allow, for_value, apply_to_all_doctypes), is_default in to_insert:
+        rows.append((
+            frappe.generate_hash(length=10), now, now, "Administrator", "Administrator", 0,
+            user, allow, for_value, apply_to_all_doctypes, is_default, 1,
+        ))
+        affected_users.add(user)
+
+    if rows:
+        frappe.db.bulk_insert("User Permission", USER_PERMISSION_FIELDS, rows)
+
+    if to_default:
+        frappe.db.set_value("User Permission", {"name": ["in", to_default]}, "is_default", 1)
+        to_default = set(to_default)
+        affected_users.update(key[0] for key, perm in existing.items() if perm.name in to_default)
+
+    if stale:
+        frappe.db.delete("User Permission", {"name": ["in", stale]})
+        stale = set(stale)
+        affected_users.update(key[0] for key, perm in existing.items() if perm.name in stale)
+
+    # Bulk writes bypass UserPermission.validate/on_update: the single-default check is done
+    # by _demote_other_defaults, and the permission cache of every touched user is cleared here
+    for user in affected_users:
+        frappe.cache().hdel("user_permissions", user)
+
+def _demote_other_defaults(desired):
+    """
+    Clear is_default on rows that compete with a desired default (same user
+    and doctype, another value), in one read and one update. Returns the users
+    whose rows changed.
+    """
+    defaults = {(user, allow): for_value for (user, allow, for_value, _all), is_default in desired.items() if is_default}
+    if not defaults:
+        return set()
+
+    demoted = [
+        row for row in frappe.get_all(
+            "User Permission",
             filters={
-                "parent": dept,
-                "parentfield": "leave_approvers"
-            }
+                "is_default": 1,
+                "user": ["in", list({user for user, _allow in defaults})],
+                "allow": ["in", list({allow for _user, allow in defaults})]
+            },
+            fields=["name", "user", "allow", "for_value"]
         )
-        approvers = {row.approver for row in approver_rows if row.approver}
+        if (row.user, row.allow) in defaults and defaults[(row.user, row.allow)] != row.for_value
+    ]
+    if demoted:
+        frappe.db.set_value("User Permission", {"name": ["in", [row.name for row in demoted]]}, "is_default", 0)
+    return {row.user for row in demoted}
 
-        # For each employee in this department
-        emp_in_dept = frappe.get_all(
-            "Employee",
-            filters={"department": dept},
-            fields=["name"]
-        )
-        for approver in approvers:
-            for emp in emp_in_dept:
-                _create_permission(
-                    user=approver,
-                    allow="Employee",
-                    for_value=emp.name,
-                    apply_to_all_doctypes=1
-                )
+@instrument()
+def sync_user_permissions(employees):
+    """
+    Background job: recompute permissions for the given Employees only,
+    removing the synced rows on them that no longer apply.
+    """
+    if employees:
+        set_user_permissions(prune=True, employees=list(set(employees)))
+
+def _enqueue_permission_sync(employees):
+    if not employees:
+        return
+    frappe.enqueue(
+        "psc_hrms.apis.cron_jobs.sync_user_permissions",
+        queue="short",
+        employees=employees,
+        enqueue_after_commit=True
+    )
 
-def _create_permission(user, allow, for_value, apply_to_all_doctypes=0, is_default=0):
+def on_employee_update(doc, method=None):
+    """
+    Employee on_update hook: resync when any field feeding permissions changes.
     """
-    Helper to create a User Permission if it does not already exist.
+    if any(doc.has_value_changed(field) for field in ("user_id", "company", "leave_approver", "department")):
+        _enqueue_permission_sync([doc.name])
+
+def on_department_update(doc, method=None):
     """
-    if not user or not for_value:
+    Department on_update hook: resync the department's employees when its
+    leave approver table changes.
+    """
+    before = doc.get_doc_before_save()
+    old_approvers = {row.approver for row in before.get("leave_approvers", [])} if before else set()
+    new_approvers = {row.approver for row in doc.get("leave_approvers", [])}
+    if old_approvers == new_approvers:
         return
 
-    try:
-        # Build existence check filters
-        filters = {
-            "user": user,
-            "allow": allow,
-            "for_value": for_value,
-            "apply_to_all_doctypes": apply_to_all_doctypes
-        }
-        
-        # Only include is_default in check if it's set to 1
-        if is_default:
-            filters["is_default"] = 1
-
-        exists = frappe.db.exists("User Permission", filters)
-        
-        if not exists:
-            perm = frappe.get_doc({
-                "doctype": "User Permission",
-                "user": user,
-                "allow": allow,
-                "for_value": for_value,
-                "apply_to_all_doctypes": apply_to_all_doctypes,
-                "is_default": is_default
-            })
-            perm.insert(ignore_permissions=True)
-            frappe.db.commit()
-    except frappe.DuplicateEntryError:
-        # Permission already exists, ignore and continue
-        frappe.db.rollback()
-    except Exception as e:
-        frappe.log_error(f"Error creating User Permission: {e}")
-        frappe.db.rollback()
\ No newline at end of file
+    _enqueue_permission_sync(frappe.get_all("Employee", filters={"department": doc.name}, pluck="name"))
@@ -0,0 +1,62 @@
+import frappe
+from frappe import _
+from frappe.model import default_fields
+from jinja2 import meta
+
+CACHE_KEY = "psc_hrms:email_templates"
+
+# (template name, modified) -> compiled subject/response and the names they reference
+_compiled_templates = {}
+
+def get_email_template(name):
+    """
+    subject/response of an Email Template, cached in Redis until the
+    template is updated.
+    """
+    tmpl = frappe.cache().hget(CACHE_KEY, name)
+    if tmpl is None:
+        tmpl = frappe.db.get_value(
+            "Email Template", name, ["name", "subject", "response", "modified"], as_dict=True
+        )
+        if not tmpl:
+            frappe.throw(_("Email Template '{0}' not found").format(name), frappe.DoesNotExistError)
+        frappe.cache().hset(CACHE_KEY, name, tmpl)
+    return tmpl
+
+def _compile(tmpl):
+    key = (tmpl.name, str(tmpl.modified))
+    compiled = _compiled_templates.get(key)
+    if compiled is None:
+        # the env frappe.render_template uses, with its frappe/_ globals
+        env = frappe.get_jenv()
+        variables = set()
+        parts = []
+        for source in (tmpl.subject or "", tmpl.response or ""):
+            # same guard as frappe.render_template
+            if ".__" in source:
+                frappe.throw(_("Illegal template"))
+            variables |= meta.find_undeclared_variables(env.parse(source))
+            parts.append(env.from_string(source))
+        compiled = _compiled_templates[key] = (parts[0], parts[1], variables)
+    return compiled
+
+def render_email_template(name, doc):
+    """
+    Render an Email Template for `doc` and return (subject, message).
+    Only the fields the template references are put in the context,
+    instead of a full doc.as_dict().
+    """
+    subject, response, variables = _compile(get_email_template(name))
+
+    context = {"doc": doc}
+    for var in variables:
+        if var in default_fields or doc.meta.has_field(var):
+            context[var] = doc.get(var)
+
+    return subject.render(context), response.render(context)
+
+def clear_email_template_cache(doc, method=None):
+    """
+    Email Template on_update / on_trash hook.
+    """
+    frappe.cache().hdel(CACHE_KEY, doc.name)
@@ -0,0 +1,66 @@
+import time
+
+import frappe
+
+CACHE_KEY = "psc_hrms:cosec_employee_map"
+CACHE_TTL = 6 * 60 * 60
+# Employee numbers found nowhere, e.g. from a misconfigured device: {number: expiry timestamp}
+UNKNOWN_CACHE_KEY = "psc_hrms:cosec_unknown_employee_numbers"
+UNKNOWN_CACHE_TTL = 5 * 60
+
+EMPLOYEE_FIELDS = ["name", "employee_name", "company", "department", "employee_number"]
+
+def get_employee_map():
+    """
+    employee_number -> Employee details for every numbered Employee.
+    Warmed from a single query and shared through Redis until it expires
+    or an Employee changes.
+    """
+    employee_map = frappe.cache().get_value(CACHE_KEY)
+    if employee_map is None:
+        employees = frappe.get_all(
+            "Employee",
+            filters={"employee_number": ["is", "set"]},
+            fields=EMPLOYEE_FIELDS
+        )
+        employee_map = {emp.employee_number: emp for emp in employees}
+        frappe.cache().set_value(CACHE_KEY, employee_map, expires_in_sec=CACHE_TTL)
+    return employee_map
+
+def get_employees(employee_numbers):
+    """
+    Resolve employee numbers from the cache, querying only for numbers it
+    does not know about yet. Numbers that query does not find either are
+    remembered for UNKNOWN_CACHE_TTL, so a device sending an unknown number
+    does not cost a query per punch.
+    """
+    employee_map = get_employee_map()
+    employees = {number: employee_map[number] for number in employee_numbers if number in employee_map}
+
+    now = time.time()
+    unknown = {
+        number: expires for number, expires in (frappe.cache().get_value(UNKNOWN_CACHE_KEY) or {}).items()
+        if expires > now
+    }
+    missing = [number for number in employee_numbers if number not in employees and number not in unknown]
+    if missing:
+        for emp in frappe.get_all(
+            "Employee",
+            filters={"employee_number": ["in", missing]},
+            fields=EMPLOYEE_FIELDS
+        ):
+            employees[emp.employee_number] = emp
+
+        not_found = [number for number in missing if number not in employees]
+        if not_found:
+            unknown.update(dict.fromkeys(not_found, now + UNKNOWN_CACHE_TTL))
+            frappe.cache().set_value(UNKNOWN_CACHE_KEY, unknown, expires_in_sec=UNKNOWN_CACHE_TTL)
+    return employees
+
+def clear_employee_cache(doc=None, method=None):
+    """
+    Employee doc_events hook (on_update also runs on insert): drop the cached
+    map so the next lookup re-warms it, and forget the unknown numbers, one of
+    which may have just been created.
+    """
+    frappe.cache().delete_value([CACHE_KEY, UNKNOWN_CACHE_KEY])
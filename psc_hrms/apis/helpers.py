@@ -11,6 +11,9 @@ def after_install():
 
 import frappe
 from frappe.utils import get_fullname
+from psc_hrms.apis.email_templates import render_email_template
+from psc_hrms.apis.approver_routing import get_approver_route
+from psc_hrms.apis.instrumentation import instrument
 
 def send_employee_notification(doc):
     """
@@ -26,10 +29,7 @@ def send_employee_notification(doc):
     # Proceed only if there are email addresses
     if employee_emails:
         # Load the notification template
-        notification_tmpl = frappe.get_doc("Email Template", "Leave Status Notification")
-        context = doc.as_dict()
-        notification_subject = frappe.render_template(notification_tmpl.subject, context)
-        notification_body = frappe.render_template(notification_tmpl.response, context)
+        notification_subject, notification_body = render_email_template("Leave Status Notification", doc)
         
         # Send the notification email to all employee email addresses
         frappe.sendmail(
@@ -62,49 +62,26 @@ def dispatch_mails(doc, method, doc_name=None):
     # Check if the current workflow_state requires sending approval emails
     template_name = template_map.get(doc.workflow_state)
     if template_name:
-        tmpl = frappe.get_doc("Email Template", template_name)
-        context = doc.as_dict()
-        subject = frappe.render_template(tmpl.subject, context)
-        body = frappe.render_template(tmpl.response, context)
+        subject, body = render_email_template(template_name, doc)
 
         # Determine recipients based on workflow_state
+        route = get_approver_route(doc.employee, doc.department)
         recipients = []
         if doc.workflow_state == "Pending Approval by Supervisor":
-            emp = frappe.get_doc("Employee", doc.employee)
-            if not emp.leave_approver:
-                frappe.log_error(f"Employee {emp.name} has no reports_to set")
+            if not route.supervisor:
+                frappe.log_error(f"Employee {doc.employee} has no reports_to set")
                 return
-            sup = frappe.get_doc("Employee", emp.reports_to)
-            recipient = sup.personal_email or sup.company_email
-            if not recipient:
-                frappe.log_error(f"Supervisor {sup.name} has no email address")
+            if not route.supervisor_email:
+                frappe.log_error(f"Supervisor {route.supervisor} has no email address")
                 return
-            recipients = [recipient]
+            recipients = [route.supervisor_email]
         elif doc.workflow_state == "Pending Approval by HOD":
-            # Fetch department filtering by name and company
-            department = frappe.get_doc("Department", {"name": doc.department, "company": doc.company})
-            if not department:
-                frappe.log_error(f"Department {doc.department} not found for company {doc.company}")
-                return
-            # Fetch all leave approvers from the department
-            for row in department.leave_approvers:
-                user = frappe.get_doc("User", row.approver)
-                if user.email:
-                    recipients.append(user.email)
+            recipients = route.hod_approver_emails
             if not recipients:
                 frappe.log_error(f"No leave approvers with email found for department {doc.department}")
                 return
         elif doc.workflow_state == "Pending Approval by HRM":
-            # Fetch all users with role "HR Manager"
-            hr_managers = frappe.get_all(
-                "User",
-                filters={
-                    "role": "HR Manager",
-                    "enabled": 1
-                },
-                fields=["email"]
-            )
-            recipients = [user.email for user in hr_managers if user.email]
+            recipients = route.hr_manager_emails
             if not recipients:
                 frappe.log_error("No HR Managers with email addresses found")
                 return
@@ -134,16 +111,29 @@ def dispatch_mails(doc, method, doc_name=None):
 
 
 import frappe
+from frappe import _
 from frappe.utils import flt
 
+# Employees allocated per background job (and per transaction) by allocate_leave_days_bulk
+ALLOCATION_CHUNK_SIZE = 25
+ALLOCATION_PROGRESS_EVENT = "psc_hrms_bulk_allocation_progress"
+
 @frappe.whitelist()
+@instrument()
 def allocate_leave_days(employee, leave_type, leave_days, from_date, to_date, additional_description=''):
     """
     Allocates leave days for an employee by creating and submitting a Leave Allocation document.
     """
     # Fetch employee details
-    emp = frappe.get_doc('Employee', employee)
+    emp = frappe.db.get_value(
+        'Employee', employee, ['name', 'employee_name', 'department', 'company'], as_dict=True
+    )
+    if not emp:
+        frappe.throw(_("Employee {0} not found").format(employee), frappe.DoesNotExistError)
+
+    return _allocate_leave(emp, leave_type, leave_days, from_date, to_date, additional_description)
 
+def _allocate_leave(emp, leave_type, leave_days, from_date, to_date, additional_description=''):
     # Build and submit Leave Allocation
     alloc = frappe.new_doc('Leave Allocation')
     alloc.employee             = emp.name
@@ -162,6 +152,89 @@ def allocate_leave_days(employee, leave_type, leave_days, from_date, to_date, ad
 
     return alloc.name
 
+@frappe.whitelist()
+@instrument()
+def allocate_leave_days_bulk(leave_type, leave_days, from_date, to_date, department=None,
+                             filters=None, employees=None, additional_description=''):
+    """
+    Allocates the same leave days to many employees: a department, an Employee
+    filter and/or an explicit employee list (active employees only).
+
+    Employees are resolved in one query and allocated by background jobs of
+    ALLOCATION_CHUNK_SIZE employees each. A chunk is all-or-nothing, and each
+    chunk reports progress to the caller through the
+    `psc_hrms_bulk_allocation_progress` realtime event.
+    """
+    if not user_can_allocate_leave():
+        frappe.throw(_("You are not allowed to allocate leave"), frappe.PermissionError)
+
+    if not (department or filters or employees):
+        frappe.throw(_("Select a department, a filter or a list of employees"))
+
+    # `filters` comes from a list view in either dict or list form; normalise to a list
+    emp_filters = frappe.parse_json(filters) if filters else []
+    if isinstance(emp_filters, dict):
+        emp_filters = [
+            [field, *value] if isinstance(value, (list, tuple)) else [field, "=", value]
+            for field, value in emp_filters.items()
+        ]
+    emp_filters.append(["status", "=", "Active"])
+    if department:
+        emp_filters.append(["department", "=", department])
+    if employees:
+        emp_filters.append(["name", "in", frappe.parse_json(employees)])
+
+    emps = frappe.get_all(
+        "Employee",
+        filters=emp_filters,
+        fields=["name", "employee_name", "department", "company"],
+        order_by="name asc"
+    )
+    if not emps:
+        frappe.throw(_("No active employees match the selection"))
+
+    batch_id = frappe.generate_hash(length=10)
+    chunks = [emps[i:i + ALLOCATION_CHUNK_SIZE] for i in range(0, len(emps), ALLOCATION_CHUNK_SIZE)]
+    for chunk_no, chunk in enumerate(chunks):
+        frappe.enqueue(
+            "psc_hrms.apis.helpers.allocate_leave_chunk",
+            queue="long",
+            enqueue_after_commit=True,
+            batch_id=batch_id,
+            chunk_no=chunk_no,
+            chunks=len(chunks),
+            employees=chunk,
+            leave_type=leave_type,
+            leave_days=leave_days,
+            from_date=from_date,
+            to_date=to_date,
+            additional_description=additional_description,
+            user=frappe.session.user
+        )
+
+    return {"batch_id": batch_id, "employees": len(emps), "chunks": len(chunks)}
+
+@instrument()
+def allocate_leave_chunk(batch_id, chunk_no, chunks, employees, leave_type, leave_days,
+                         from_date, to_date, additional_description, user):
+    """
+    Background job: allocate one chunk of allocate_leave_days_bulk in a single
+    transaction. Any failure rolls the whole chunk back.
+    """
+    progress = {"batch_id": batch_id, "chunk": chunk_no, "chunks": chunks, "employees": len(employees)}
+    try:
+        allocations = [
+            _allocate_leave(frappe._dict(emp), leave_type, leave_days, from_date, to_date, additional_description)
+            for emp in employees
+        ]
+        frappe.db.commit()
+        progress.update({"success": True, "allocations": allocations})
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Bulk leave allocation {batch_id} chunk {chunk_no} failed: {e}")
+        progress.update({"success": False, "error": str(e)})
+
+    frappe.publish_realtime(ALLOCATION_PROGRESS_EVENT, progress, user=user)
 
 import frappe
 
@@ -223,9 +296,9 @@ def dispatch_notices(doc, method, doc_name=None):
         )
         return
 
-    # 3) Load the Email Template
+    # 3) Render the Email Template
     try:
-        tmpl = frappe.get_doc("Email Template", "Informative Notice for Leave")
+        subject, body = render_email_template("Informative Notice for Leave", doc)
     except frappe.DoesNotExistError:
         frappe.log_error(
             message="Email Template 'Informative Notice for Leave' not found",
@@ -233,12 +306,7 @@ def dispatch_notices(doc, method, doc_name=None):
         )
         return
 
-    # 4) Render with context
-    context = doc.as_dict()
-    subject = frappe.render_template(tmpl.subject, context)
-    body = frappe.render_template(tmpl.response, context)
-
-    # 5) Send the email
+    # 4) Send the email
     try:
         frappe.sendmail(
             recipients=[recipient],
@@ -258,60 +326,163 @@ import json
 import frappe
 import datetime
 from datetime import date
+from frappe import _
+from frappe.utils import flt, getdate
 
 @frappe.whitelist()
 def get_leave_approver(employee):
     """
     Returns the appropriate leave approver for the given employee.
     """
-    # Try direct leave_approver on Employee
-    leave_approver, department = frappe.db.get_value(
-        "Employee", employee,
-        ["leave_approver", "department"]
-    )
-
-    # If not set, fallback to first Department Approver
-    if not leave_approver and department:
-        leave_approver = frappe.db.get_value(
-            "Department Approver",
-            {"parent": department, "parentfield": "leave_approvers", "idx": 1},
-            "approver"
-        )
+    # Direct leave_approver on Employee, else the first Department Approver,
+    # as resolved in the approver routing table
+    leave_approver = get_approver_route(employee).leave_approver
 
     return leave_approver
 
 
+# Upper bound on rows accepted by create_leave_applications in one call
+MAX_LEAVE_APPLICATIONS_PER_CALL = 50
+
 @frappe.whitelist()
+@instrument()
 def create_leave_applications(employee, applications):
     """
     Creates Leave Application docs for the given employee and list of applications.
     Automatically sets leave_approver via get_leave_approver().
+
+    Employee and approver data are fetched once and the whole batch is checked
+    for overlaps and leave balance up front. Returns one result per row:
+    {"row", "name"} when created or {"row", "error"} when rejected.
     """
-    created = []
+    from hrms.hr.doctype.leave_application.leave_application import (
+        get_leave_balance_on,
+        get_number_of_leave_days,
+    )
+
+    applications = frappe.parse_json(applications)
+    if len(applications) > MAX_LEAVE_APPLICATIONS_PER_CALL:
+        frappe.throw(_("At most {0} leave applications can be created at once").format(
+            MAX_LEAVE_APPLICATIONS_PER_CALL))
+
+    employee_doc = frappe.db.get_value(
+        "Employee", employee, ["employee_name", "company", "department", "holiday_list"], as_dict=True
+    )
+    if not employee_doc:
+        frappe.throw(_("Employee {0} not found").format(employee), frappe.DoesNotExistError)
 
     # Determine the approver and their name once
     approver = get_leave_approver(employee)
-    approver_name = None
-    if approver:
-        approver_name = frappe.db.get_value("Employee", approver, "employee_name")
-
-    for app in json.loads(applications):
-        employee_doc = frappe.get_doc("Employee", employee)
-
-        la = frappe.new_doc("Leave Application")
-        la.update({
-            "employee": employee,
-            "employee_name": employee_doc.employee_name,
-            "leave_type": app["leave_type"],
-            "from_date": app["from_date"],
-            "to_date": app["to_date"],
-            "company": employee_doc.company,
-            "department": employee_doc.department,
-            "leave_approver": approver,
-            "leave_approver_name": approver_name,
-            "posting_date": date.today()
-        })
-        la.insert()
-        created.append(la.name)
-
-    return created
+    approver_name = get_fullname(approver) if approver else None
+
+    errors = _validate_leave_batch(employee, applications, get_leave_balance_on, get_number_of_leave_days)
+
+    results = []
+    total = len(applications)
+    for idx, app in enumerate(applications):
+        if total > 10:
+            frappe.publish_progress(idx * 100 / total, title=_("Creating Leave Applications"))
+
+        if errors[idx]:
+            results.append({"row": idx, "error": errors[idx]})
+            continue
+
+        frappe.db.savepoint("leave_application_row")
+        try:
+            la = frappe.new_doc("Leave Application")
+            la.update({
+                "employee": employee,
+                "employee_name": employee_doc.employee_name,
+                "leave_type": app["leave_type"],
+                "from_date": app["from_date"],
+                "to_date": app["to_date"],
+                "company": employee_doc.company,
+                "department": employee_doc.department,
+                "leave_approver": approver,
+                "leave_approver_name": approver_name,
+                "posting_date": date.today()
+            })
+            la.insert()
+            results.append({"row": idx, "name": la.name})
+        except Exception as e:
+            frappe.db.rollback(save_point="leave_application_row")
+            frappe.clear_last_message()
+            results.append({"row": idx, "error": str(e)})
+
+    return results
+
+def _validate_leave_batch(employee, applications, get_leave_balance_on, get_number_of_leave_days):
+    """
+    Per-row error message (or None) for a batch of leave applications: date
+    order, overlaps with existing applications and with earlier rows of the
+    batch, and the running leave balance per leave type.
+    """
+    errors = [None] * len(applications)
+    rows = []
+    for idx, app in enumerate(applications):
+        if not (app.get("leave_type") and app.get("from_date") and app.get("to_date")):
+            errors[idx] = _("Leave type, from date and to date are required")
+            rows.append((None, None))
+            continue
+
+        from_date, to_date = getdate(app["from_date"]), getdate(app["to_date"])
+        if to_date < from_date:
+            errors[idx] = _("To Date cannot be before From Date")
+        rows.append((from_date, to_date))
+
+    valid = [idx for idx in range(len(applications)) if not errors[idx]]
+    if not valid:
+        return errors
+
+    # existing applications that may overlap any row, in one query
+    booked = [
+        (getdate(la.from_date), getdate(la.to_date), la.name)
+        for la in frappe.get_all(
+            "Leave Application",
+            filters=[
+                ["employee", "=", employee],
+                ["docstatus", "<", 2],
+                ["status", "not in", ["Rejected", "Cancelled"]],
+                ["from_date", "<=", max(rows[idx][1] for idx in valid)],
+                ["to_date", ">=", min(rows[idx][0] for idx in valid)]
+            ],
+            fields=["name", "from_date", "to_date"]
+        )
+    ]
+
+    leave_types = {
+        lt.name: lt for lt in frappe.get_all(
+            "Leave Type",
+            filters={"name": ["in", list({applications[idx]["leave_type"] for idx in valid})]},
+            fields=["name", "allow_negative", "is_lwp"]
+        )
+    }
+    balances = {}
+
+    for idx in valid:
+        app = applications[idx]
+        from_date, to_date = rows[idx]
+
+        clash = next((b for b in booked if b[0] <= to_date and b[1] >= from_date), None)
+        if clash:
+            errors[idx] = _("Overlaps with Leave Application {0}").format(clash[2] or _("in this batch"))
+            continue
+
+        leave_type = leave_types.get(app["leave_type"])
+        if not leave_type:
+            errors[idx] = _("Leave Type {0} not found").format(app["leave_type"])
+            continue
+
+        if not (leave_type.allow_negative or leave_type.is_lwp):
+            if leave_type.name not in balances:
+                balances[leave_type.name] = flt(get_leave_balance_on(employee, leave_type.name, from_date, to_date))
+            days = flt(get_number_of_leave_days(employee, leave_type.name, from_date, to_date))
+            if days > balances[leave_type.name]:
+                errors[idx] = _("Insufficient {0} balance: {1} day(s) requested, {2} available").format(
+                    leave_type.name, days, balances[leave_type.name])
+                continue
+            balances[leave_type.name] -= days
+
+        booked.append((from_date, to_date, None))
+
+    return errors
@@ -0,0 +1,276 @@
+import cProfile
+import functools
+import io
+import pstats
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+from werkzeug.wrappers import Response
+
+METRICS_KEY = "psc_hrms:metrics:{0}"
+ENDPOINTS_KEY = "psc_hrms:metrics:endpoints"
+PROFILES_KEY = "psc_hrms:metrics:profiles"
+PROFILING_KEY = "psc_hrms:metrics:profiling"
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+# Counters kept per endpoint next to the buckets
+COUNTERS = ("count", "errors", "duration_ms", "queries", "query_ms", "rows")
+# Profiles kept for the summary page, newest first
+MAX_PROFILES = 20
+# The profiler switches itself off after this long
+PROFILING_TTL = 60 * 60
+
+def instrument(name=None):
+    """
+    Record duration, DB query count/time, rows touched and outcome of every
+    call into per-endpoint Redis histograms. Put it below @frappe.whitelist():
+
+        @frappe.whitelist()
+        @instrument()
+        def get_staff(): ...
+
+    A call counts as an error when it raises or returns a dict with "error",
+    the convention of the APIs here. Metrics are never allowed to fail the call.
+    """
+    def decorator(fn):
+        endpoint = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # only the outermost instrumented call is profiled
+            profiler = None if getattr(frappe.local, "psc_query_stats", None) else _start_profiler()
+            failed = True
+            start = time.perf_counter()
+            with track_queries() as queries:
+                try:
+                    result = fn(*args, **kwargs)
+                    failed = isinstance(result, dict) and bool(result.get("error"))
+                    return result
+                finally:
+                    duration_ms = (time.perf_counter() - start) * 1000
+                    try:
+                        _record(endpoint, duration_ms, queries, failed)
+                        if profiler:
+                            _save_profile(endpoint, profiler, duration_ms)
+                    except Exception:
+                        frappe.logger("psc_hrms").exception(f"Could not record metrics for {endpoint}")
+
+        return wrapper
+
+    return decorator
+
+@contextmanager
+def track_queries():
+    """
+    Count the statements run through frappe.db.sql while the block runs,
+    with their total time and the rows they returned or changed. Blocks can
+    nest; each sees the queries of everything inside it.
+    """
+    stats = {"queries": 0, "query_time": 0.0, "rows": 0}
+    if not getattr(frappe.local, "psc_query_stats", None):
+        frappe.local.psc_query_stats = []
+        _patch_sql(frappe.local.psc_query_stats)
+    active = frappe.local.psc_query_stats
+    active.append(stats)
+    try:
+        yield stats
+    finally:
+        active.remove(stats)
+        if not active:
+            # drop the instance attribute, uncovering Database.sql again
+            frappe.local.db.__dict__.pop("sql", None)
+
+def _patch_sql(active):
+    db = frappe.local.db
+    original = type(db).sql
+
+    def sql(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(db, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            rowcount = max(getattr(db._cursor, "rowcount", 0) or 0, 0) if db._cursor else 0
+            for stats in active:
+                stats["queries"] += 1
+                stats["query_time"] += elapsed
+                stats["rows"] += rowcount
+
+    db.sql = sql
+
+def _bucket(duration_ms):
+    for bound in BUCKETS_MS:
+        if duration_ms <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+def _record(endpoint, duration_ms, queries, failed):
+    cache = frappe.cache()
+    key = cache.make_key(METRICS_KEY.format(endpoint))
+    pipe = cache.pipeline()
+    pipe.sadd(cache.make_key(ENDPOINTS_KEY), endpoint)
+    pipe.hincrby(key, "count", 1)
+    pipe.hincrby(key, "errors", int(failed))
+    pipe.hincrbyfloat(key, "duration_ms", duration_ms)
+    pipe.hincrby(key, "queries", queries["queries"])
+    pipe.hincrbyfloat(key, "query_ms", queries["query_time"] * 1000)
+    pipe.hincrby(key, "rows", queries["rows"])
+    pipe.hincrby(key, _bucket(duration_ms), 1)
+    pipe.execute()
+
+def _start_profiler():
+    settings = frappe.cache().get_value(PROFILING_KEY)
+    if not settings or random.random() >= settings["sample_rate"]:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler (e.g. the Recorder) is already active
+        return None
+    return profiler
+
+def _save_profile(endpoint, profiler, duration_ms):
+    profiler.disable()
+    settings = frappe.cache().get_value(PROFILING_KEY) or {}
+    if duration_ms < settings.get("slow_ms", 0):
+        return
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+    cache = frappe.cache()
+    cache.lpush(PROFILES_KEY, frappe.as_json({
+        "endpoint": endpoint,
+        "duration_ms": round(duration_ms, 1),
+        "at": str(frappe.utils.now_datetime()),
+        "stats": out.getvalue(),
+    }))
+    cache.ltrim(PROFILES_KEY, 0, MAX_PROFILES - 1)
+
+def _load_endpoints():
+    return sorted(
+        member.decode() if isinstance(member, bytes) else member
+        for member in frappe.cache().smembers(ENDPOINTS_KEY)
+    )
+
+def _load_metrics():
+    # The pipeline and hmget are plain redis-py calls, so keys are made by hand
+    cache = frappe.cache()
+    endpoints = _load_endpoints()
+    fields = list(COUNTERS) + [f"le_{bound}" for bound in BUCKETS_MS] + ["le_inf"]
+    metrics = {}
+    for endpoint in endpoints:
+        values = cache.hmget(cache.make_key(METRICS_KEY.format(endpoint)), fields)
+        metrics[endpoint] = {field: float(value or 0) for field, value in zip(fields, values)}
+    return metrics
+
+def _cumulative_buckets(values):
+    running = 0
+    buckets = []
+    for bound in BUCKETS_MS:
+        running += values[f"le_{bound}"]
+        buckets.append((bound, running))
+    buckets.append(("+Inf", running + values["le_inf"]))
+    return buckets
+
+def _estimate_percentile(values, pct):
+    """
+    Upper bound (ms) of the bucket holding the pct-th call; None past the last bucket.
+    """
+    target = values["count"] * pct / 100.0
+    for bound, running in _cumulative_buckets(values):
+        if running >= target:
+            return None if bound == "+Inf" else bound
+    return None
+
+@frappe.whitelist()
+def metrics():
+    """
+    All endpoint histograms in the Prometheus text exposition format, for a
+    scraper authenticating with a System Manager's API key.
+    """
+    frappe.only_for("System Manager")
+
+    lines = [
+        "# HELP psc_hrms_call_duration_seconds Duration of instrumented API calls and jobs.",
+        "# TYPE psc_hrms_call_duration_seconds histogram",
+    ]
+    all_metrics = _load_metrics()
+    for endpoint, values in all_metrics.items():
+        label = f'endpoint="{endpoint}"'
+        for bound, running in _cumulative_buckets(values):
+            le = bound if bound == "+Inf" else bound / 1000.0
+            lines.append(f'psc_hrms_call_duration_seconds_bucket{{{label},le="{le}"}} {running:g}')
+        lines.append(f"psc_hrms_call_duration_seconds_sum{{{label}}} {values['duration_ms'] / 1000.0:g}")
+        lines.append(f"psc_hrms_call_duration_seconds_count{{{label}}} {values['count']:g}")
+
+    for metric, field, help_text, scale in (
+        ("psc_hrms_call_errors_total", "errors", "Calls that raised or returned an error.", 1),
+        ("psc_hrms_db_queries_total", "queries", "DB queries run by instrumented calls.", 1),
+        ("psc_hrms_db_query_seconds_total", "query_ms", "Time spent in DB queries.", 1000.0),
+        ("psc_hrms_db_rows_total", "rows", "Rows returned or changed by those queries.", 1),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for endpoint, values in all_metrics.items():
+            lines.append(f'{metric}{{endpoint="{endpoint}"}} {values[field] / scale:g}')
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@frappe.whitelist()
+def get_metrics_summary():
+    """
+    Per-endpoint totals for the API Metrics page, slowest on average first.
+    """
+    frappe.only_for("System Manager")
+
+    rows = []
+    for endpoint, values in _load_metrics().items():
+        count = values["count"] or 1
+        rows.append({
+            "endpoint": endpoint,
+            "calls": int(values["count"]),
+            "errors": int(values["errors"]),
+            "avg_ms": round(values["duration_ms"] / count, 1),
+            "p50_ms": _estimate_percentile(values, 50),
+            "p99_ms": _estimate_percentile(values, 99),
+            "queries_per_call": round(values["queries"] / count, 1),
+            "query_share": round(values["query_ms"] / values["duration_ms"], 2) if values["duration_ms"] else 0,
+            "rows_per_call": round(values["rows"] / count, 1),
+        })
+    rows.sort(key=lambda row: row["avg_ms"], reverse=True)
+
+    cache = frappe.cache()
+    profiles = [frappe.parse_json(item) for item in cache.lrange(PROFILES_KEY, 0, MAX_PROFILES - 1)]
+    return {"endpoints": rows, "profiling": cache.get_value(PROFILING_KEY), "profiles": profiles}
+
+@frappe.whitelist()
+def set_profiling(sample_rate=0, slow_ms=1000):
+    """
+    Profile a `sample_rate` fraction of instrumented calls and keep the
+    cProfile stats of those slower than `slow_ms`. Switches itself off after
+    an hour; sample_rate 0 switches it off now.
+    """
+    frappe.only_for("System Manager")
+
+    sample_rate = min(max(float(sample_rate), 0), 1)
+    if not sample_rate:
+        frappe.cache().delete_value(PROFILING_KEY)
+        return None
+
+    settings = {"sample_rate": sample_rate, "slow_ms": float(slow_ms)}
+    frappe.cache().set_value(PROFILING_KEY, settings, expires_in_sec=PROFILING_TTL)
+    return settings
+
+@frappe.whitelist()
+def reset_metrics():
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    for endpoint in _load_endpoints():
+        cache.delete(cache.make_key(METRICS_KEY.format(endpoint)))
+    cache.delete(cache.make_key(ENDPOINTS_KEY))
+    cache.delete(cache.make_key(PROFILES_KEY))
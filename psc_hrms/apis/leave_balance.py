@@ -0,0 +1,137 @@
+import frappe
+from frappe.utils import flt, getdate, now_datetime
+
+def _balance_name(employee, leave_type, period):
+    return f"{employee}::{leave_type}::{period}"
+
+def _period(to_date):
+    return str(getdate(to_date).year)
+
+def apply_allocation_delta(employee, leave_type, period, delta, count):
+    """
+    Add `delta` leaves / `count` allocations to a balance row. A single upsert
+    on the primary key, so concurrent submits cannot lose updates.
+    """
+    now = now_datetime()
+    frappe.db.sql("""
+        INSERT INTO `tabLeave Allocation Balance`
+            (name, creation, modified, owner, modified_by, docstatus, idx,
+             employee, leave_type, period, total_leaves_allocated, allocations)
+        VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+             %(employee)s, %(leave_type)s, %(period)s, %(delta)s, %(count)s)
+        ON DUPLICATE KEY UPDATE
+            total_leaves_allocated = total_leaves_allocated + VALUES(total_leaves_allocated),
+            allocations = allocations + VALUES(allocations),
+            modified = VALUES(modified)
+    """, {
+        "name": _balance_name(employee, leave_type, period),
+        "now": now,
+        "user": frappe.session.user,
+        "employee": employee,
+        "leave_type": leave_type,
+        "period": period,
+        "delta": flt(delta),
+        "count": count,
+    })
+
+def get_allocated_total(employee, leave_type, period=None):
+    """
+    SUM(total_leaves_allocated) of submitted, non-expired Leave Allocations,
+    read from the balance rows instead of scanning allocations.
+    """
+    filters = {"employee": employee, "leave_type": leave_type}
+    if period:
+        filters["period"] = str(period)
+    return flt(frappe.db.get_value("Leave Allocation Balance", filters, "sum(total_leaves_allocated)"))
+
+def on_allocation_submit(doc, method=None):
+    apply_allocation_delta(doc.employee, doc.leave_type, _period(doc.to_date), doc.total_leaves_allocated, 1)
+
+def on_allocation_cancel(doc, method=None):
+    # expired allocations were already taken out by on_ledger_entry_insert
+    if not doc.expired:
+        apply_allocation_delta(doc.employee, doc.leave_type, _period(doc.to_date), -flt(doc.total_leaves_allocated), -1)
+
+def on_allocation_update_after_submit(doc, method=None):
+    before = doc.get_doc_before_save()
+    if before and not doc.expired:
+        delta = flt(doc.total_leaves_allocated) - flt(before.total_leaves_allocated)
+        if delta:
+            apply_allocation_delta(doc.employee, doc.leave_type, _period(doc.to_date), delta, 0)
+
+def on_ledger_entry_insert(doc, method=None):
+    """
+    Leave Ledger Entry after_insert hook. HRMS expires allocations by writing
+    an is_expired ledger entry and flagging the allocation without saving it,
+    so expiry is picked up here. Carry-forward expiry entries are skipped:
+    their allocation stays live. An allocation expired with no unused leaves
+    gets no ledger entry at all; fix_leave_balances catches those nightly.
+    """
+    if not (doc.is_expired and doc.transaction_type == "Leave Allocation" and doc.transaction_name):
+        return
+    if doc.is_carry_forward:
+        return
+
+    alloc = frappe.db.get_value(
+        "Leave Allocation", doc.transaction_name,
+        ["employee", "leave_type", "to_date", "total_leaves_allocated"], as_dict=True
+    )
+    if alloc:
+        apply_allocation_delta(alloc.employee, alloc.leave_type, _period(alloc.to_date), -flt(alloc.total_leaves_allocated), -1)
+
+@frappe.whitelist()
+def reconcile_leave_balances(fix=False):
+    """
+    Compare the balance rows with the Leave Allocations they summarise and
+    return the mismatches. With `fix`, mismatching rows are rewritten from source.
+
+        bench --site <site> execute psc_hrms.apis.leave_balance.reconcile_leave_balances --kwargs "{'fix': 1}"
+    """
+    frappe.only_for("System Manager")
+
+    mismatches = _reconcile(fix)
+    if frappe.parse_json(fix):
+        frappe.db.commit()
+    return mismatches
+
+def fix_leave_balances():
+    # Nightly, after HRMS expires allocations; the scheduler commits
+    _reconcile(fix=True)
+
+def _reconcile(fix=False):
+    source = {
+        (row.employee, row.leave_type, str(row.period)): row
+        for row in frappe.db.sql("""
+            SELECT employee, leave_type, YEAR(to_date) AS period,
+                SUM(total_leaves_allocated) AS total_leaves_allocated, COUNT(*) AS allocations
+            FROM `tabLeave Allocation`
+            WHERE docstatus = 1 AND expired = 0
+            GROUP BY employee, leave_type, YEAR(to_date)
+        """, as_dict=True)
+    }
+    ledger = {
+        (row.employee, row.leave_type, row.period): row
+        for row in frappe.get_all(
+            "Leave Allocation Balance",
+            fields=["employee", "leave_type", "period", "total_leaves_allocated", "allocations"]
+        )
+    }
+
+    mismatches = []
+    for key in set(source) | set(ledger):
+        expected = source.get(key) or frappe._dict(total_leaves_allocated=0, allocations=0)
+        actual = ledger.get(key) or frappe._dict(total_leaves_allocated=0, allocations=0)
+        if (
+            abs(flt(expected.total_leaves_allocated) - flt(actual.total_leaves_allocated)) > 1e-6
+            or expected.allocations != actual.allocations
+        ):
+            mismatches.append({
+                "employee": key[0], "leave_type": key[1], "period": key[2],
+                "expected": flt(expected.total_leaves_allocated), "actual": flt(actual.total_leaves_allocated),
+            })
+            if frappe.parse_json(fix):
+                frappe.db.delete("Leave Allocation Balance", {"name": _balance_name(*key)})
+                if key in source:
+                    apply_allocation_delta(*key, expected.total_leaves_allocated, expected.allocations)
+
+    return mismatches
@@ -0,0 +1,92 @@
+import frappe
+from frappe.utils import now_datetime, time_diff_in_seconds
+
+def queue_notification(doc, recipients, subject, message):
+    """
+    Buffer an already rendered workflow email for `doc`. Nothing is sent inside
+    the request: after the transaction commits, all buffered emails are handed
+    to one background job that puts them on the Email Queue.
+
+    Within a request the latest transition of a document wins; repeated
+    notifications with the same content are merged into one email.
+    """
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return
+
+    pending = frappe.local.flags.setdefault("psc_pending_notifications", {})
+    if not pending:
+        frappe.db.after_commit.add(_flush_notifications)
+        frappe.db.after_rollback.add(_discard_notifications)
+
+    key = (doc.doctype, doc.name)
+    current = pending.get(key)
+    if current and current["subject"] == subject and current["message"] == message:
+        current["recipients"] = sorted(set(current["recipients"]) | set(recipients))
+        return
+
+    pending[key] = {
+        "recipients": sorted(set(recipients)),
+        "subject": subject,
+        "message": message,
+        "reference_doctype": doc.doctype,
+        "reference_name": doc.name,
+        "queued_at": str(now_datetime()),
+    }
+
+def _flush_notifications():
+    pending = frappe.local.flags.pop("psc_pending_notifications", None)
+    if pending:
+        frappe.enqueue(
+            "psc_hrms.apis.notifications.send_notifications",
+            queue="short",
+            notifications=list(pending.values())
+        )
+
+def _discard_notifications():
+    frappe.local.flags.pop("psc_pending_notifications", None)
+
+def send_notifications(notifications):
+    """
+    Background job: move buffered notifications onto the Email Queue.
+    """
+    for n in notifications:
+        try:
+            frappe.sendmail(
+                recipients=n["recipients"],
+                subject=n["subject"],
+                message=n["message"],
+                reference_doctype=n["reference_doctype"],
+                reference_name=n["reference_name"]
+            )
+            frappe.logger("psc_hrms").info(
+                f"Queued notification for {n['reference_name']} "
+                f"{time_diff_in_seconds(now_datetime(), n['queued_at']):.1f}s after the transition"
+            )
+        except Exception as e:
+            frappe.log_error(f"Failed to queue notification for {n['reference_name']}: {e}")
+
+@frappe.whitelist()
+def get_notification_latency(reference_doctype="Public Holiday and Off Days Claim Form", days=7):
+    """
+    Delivery latency of workflow emails (Email Queue creation -> sent), kept
+    apart from request latency since sending no longer happens in the request.
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+
+    stats = frappe.db.sql("""
+        SELECT
+            COUNT(*) AS sent,
+            AVG(TIMESTAMPDIFF(SECOND, creation, modified)) AS avg_seconds,
+            MAX(TIMESTAMPDIFF(SECOND, creation, modified)) AS max_seconds
+        FROM `tabEmail Queue`
+        WHERE reference_doctype = %s
+            AND status = 'Sent'
+            AND creation >= NOW() - INTERVAL %s DAY
+    """, (reference_doctype, int(days)), as_dict=True)[0]
+
+    stats["pending"] = frappe.db.count("Email Queue", {
+        "reference_doctype": reference_doctype,
+        "status": ["in", ["Not Sent", "Sending"]]
+    })
+    return stats
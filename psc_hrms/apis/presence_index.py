@@ -0,0 +1,125 @@
+import frappe
+from frappe.utils import getdate, now_datetime
+
+# Attendance statuses that count as having worked the day
+PRESENT_STATUSES = ("Present", "Half Day", "Work From Home")
+
+# Month rows written per INSERT statement
+UPSERT_CHUNK_SIZE = 1000
+
+def _month_key(day):
+    return day.strftime("%Y-%m")
+
+def _row_name(employee, month):
+    return f"{employee}::{month}"
+
+def mark_present(days):
+    """
+    Set the bits for an iterable of (employee, date) pairs. One multi-row
+    upsert; bits are OR-ed in, so concurrent writers cannot clear each other.
+    """
+    bitmaps = {}
+    for employee, day in days:
+        day = getdate(day)
+        key = (employee, _month_key(day))
+        bitmaps[key] = bitmaps.get(key, 0) | (1 << (day.day - 1))
+    if not bitmaps:
+        return
+
+    now = now_datetime()
+    items = list(bitmaps.items())
+    for start in range(0, len(items), UPSERT_CHUNK_SIZE):
+        values = []
+        params = []
+        for (employee, month), bitmap in items[start:start + UPSERT_CHUNK_SIZE]:
+            values.append("(%s, %s, %s, %s, %s, 0, 0, %s, %s, %s)")
+            params.extend([
+                _row_name(employee, month), now, now, frappe.session.user, frappe.session.user,
+                employee, month, bitmap
+            ])
+
+        frappe.db.sql(f"""
+            INSERT INTO `tabEmployee Presence Month`
+                (name, creation, modified, owner, modified_by, docstatus, idx,
+                 employee, month, days_bitmap)
+            VALUES {", ".join(values)}
+            ON DUPLICATE KEY UPDATE
+                days_bitmap = days_bitmap | VALUES(days_bitmap),
+                modified = VALUES(modified)
+        """, params)
+
+def get_present_days(employee, dates):
+    """
+    The subset of `dates` on which the employee was present, read from the
+    month rows covering them in a single query.
+    """
+    dates = {getdate(day) for day in dates}
+    if not dates:
+        return set()
+
+    bitmaps = dict(frappe.get_all(
+        "Employee Presence Month",
+        filters={"name": ["in", list({_row_name(employee, _month_key(day)) for day in dates})]},
+        fields=["month", "days_bitmap"],
+        as_list=True
+    ))
+    return {
+        day for day in dates
+        if (bitmaps.get(_month_key(day)) or 0) >> (day.day - 1) & 1
+    }
+
+def refresh_presence(employee, day):
+    """
+    Recompute one day's bit from the submitted Attendance and Employee
+    Checkins that remain, clearing it when neither shows presence.
+    """
+    day = getdate(day)
+    present = frappe.db.exists(
+        "Attendance",
+        {"employee": employee, "attendance_date": day, "docstatus": 1, "status": ["in", PRESENT_STATUSES]}
+    ) or frappe.db.sql("""
+        SELECT 1 FROM `tabEmployee Checkin`
+        WHERE employee = %(employee)s AND time >= %(day)s AND time < %(day)s + INTERVAL 1 DAY
+        LIMIT 1
+    """, {"employee": employee, "day": day})
+    if present:
+        mark_present([(employee, day)])
+        return
+
+    frappe.db.sql("""
+        UPDATE `tabEmployee Presence Month`
+        SET days_bitmap = days_bitmap & ~%(bit)s, modified = %(now)s
+        WHERE name = %(name)s
+    """, {"bit": 1 << (day.day - 1), "now": now_datetime(), "name": _row_name(employee, _month_key(day))})
+
+def on_attendance_submit(doc, method=None):
+    # Attendance marked by hand (or by HRMS auto attendance) has no COSEC punch behind it
+    if doc.status in PRESENT_STATUSES:
+        mark_present([(doc.employee, doc.attendance_date)])
+
+def on_attendance_cancel(doc, method=None):
+    refresh_presence(doc.employee, doc.attendance_date)
+
+def on_checkin_insert(doc, method=None):
+    # Checkins created through the desk or HRMS; ingestion bulk-inserts and calls mark_present itself
+    if doc.employee:
+        mark_present([(doc.employee, doc.time)])
+
+def rebuild_presence_index():
+    """
+    Recompute every month row from Attendance and Employee Checkin.
+    """
+    frappe.db.delete("Employee Presence Month")
+    rows = frappe.db.sql("""
+        SELECT employee, day
+        FROM (
+            SELECT employee, attendance_date AS day
+            FROM `tabAttendance`
+            WHERE docstatus = 1 AND status IN %(statuses)s
+            UNION
+            SELECT employee, DATE(time) AS day
+            FROM `tabEmployee Checkin`
+        ) presence
+        WHERE employee IS NOT NULL
+    """, {"statuses": PRESENT_STATUSES})
+    mark_present(rows)
@@ -0,0 +1,154 @@
+import json
+import frappe
+from frappe.utils import add_to_date, now_datetime, time_diff_in_seconds
+from psc_hrms.apis.instrumentation import instrument
+
+# Rows drained per pass; one pass is ingested as a single batch
+DRAIN_BATCH_SIZE = 1000
+DRAIN_JOB_ID = "psc_hrms_drain_punch_queue"
+# A punch whose ingestion keeps failing with a retryable error is marked Failed after this many tries
+MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled on every further attempt
+RETRY_DELAY_SECONDS = 60
+
+QUEUE_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "employee_number", "event_time", "index_no", "status", "payload",
+)
+
+def queue_events(events):
+    """
+    Validate COSEC events and append them to the Attendance Punch Queue.
+    Returns one result per event; the actual ingestion happens in the drain job.
+    """
+    from psc_hrms.apis.staff_attendance import _parse_event
+
+    results = []
+    rows = []
+    now = now_datetime()
+
+    for data in events:
+        try:
+            event = _parse_event(data)
+        except Exception as e:
+            results.append({"index_no": (data or {}).get("index_no"), "error": str(e)})
+            continue
+
+        rows.append((
+            frappe.generate_hash(length=10), now, now, frappe.session.user, frappe.session.user, 0,
+            event.employee_number, event.event_dt, event.index_no, "Queued", json.dumps(data),
+        ))
+        results.append({"index_no": event.index_no, "success": True, "queued": True})
+
+    if rows:
+        frappe.db.bulk_insert("Attendance Punch Queue", QUEUE_FIELDS, rows)
+        enqueue_drain()
+
+    return results
+
+def enqueue_drain():
+    """
+    Start the drain job once the current transaction commits. The fixed job id
+    keeps a single drainer running, which preserves per-employee order.
+    """
+    frappe.enqueue(
+        "psc_hrms.apis.punch_queue.drain_punch_queue",
+        queue="short",
+        job_id=DRAIN_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=True
+    )
+
+@instrument()
+def drain_punch_queue():
+    """
+    Ingest queued punches that are due, ordered by employee and event time, in
+    batches of DRAIN_BATCH_SIZE, until none is left.
+
+    A punch failing with a retryable error (see _ingest_events) stays Queued
+    and is tried again after an exponential backoff, up to MAX_ATTEMPTS times;
+    the per-minute enqueue_drain picks it up. Other errors mark it Failed
+    straight away; requeue_failed_punches puts Failed punches back.
+    """
+    from psc_hrms.apis.staff_attendance import _ingest_events
+
+    while True:
+        now = now_datetime()
+        rows = frappe.get_all(
+            "Attendance Punch Queue",
+            filters={"status": "Queued"},
+            or_filters=[["next_attempt_at", "is", "not set"], ["next_attempt_at", "<=", now]],
+            fields=["name", "payload", "attempts"],
+            order_by="employee_number asc, event_time asc, creation asc",
+            limit_page_length=DRAIN_BATCH_SIZE
+        )
+        if not rows:
+            break
+
+        results = _ingest_events([json.loads(row.payload) for row in rows])
+
+        processed = [row.name for row, result in zip(rows, results) if result.get("success")]
+        if processed:
+            frappe.db.set_value(
+                "Attendance Punch Queue",
+                {"name": ["in", processed]},
+                {"status": "Processed", "processed_on": now_datetime()},
+                update_modified=True
+            )
+        for row, result in zip(rows, results):
+            if result.get("success"):
+                continue
+            attempts = (row.attempts or 0) + 1
+            values = {"attempts": attempts, "error": result.get("error")}
+            if result.get("retryable") and attempts < MAX_ATTEMPTS:
+                values["next_attempt_at"] = add_to_date(now, seconds=RETRY_DELAY_SECONDS * 2 ** (attempts - 1))
+            else:
+                values.update({"status": "Failed", "processed_on": now_datetime()})
+            frappe.db.set_value("Attendance Punch Queue", row.name, values)
+        frappe.db.commit()
+
+        if len(rows) < DRAIN_BATCH_SIZE:
+            break
+
+@frappe.whitelist()
+def requeue_failed_punches(names=None):
+    """
+    Put Failed punches (all, or the given names) back in the queue with a
+    fresh attempt count, e.g. once a missing Employee has been created.
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+
+    filters = {"status": "Failed"}
+    if names:
+        filters["name"] = ["in", frappe.parse_json(names)]
+    requeued = frappe.get_all("Attendance Punch Queue", filters=filters, pluck="name")
+    if requeued:
+        frappe.db.set_value(
+            "Attendance Punch Queue",
+            {"name": ["in", requeued]},
+            {"status": "Queued", "attempts": 0, "next_attempt_at": None, "error": None, "processed_on": None},
+            update_modified=True
+        )
+        enqueue_drain()
+    return len(requeued)
+
+@frappe.whitelist()
+def get_punch_queue_metrics():
+    """
+    Queue depth and lag (age of the oldest queued punch, in seconds).
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+
+    depth = frappe.db.count("Attendance Punch Queue", {"status": "Queued"})
+    failed = frappe.db.count("Attendance Punch Queue", {"status": "Failed"})
+    oldest = frappe.db.get_value(
+        "Attendance Punch Queue",
+        {"status": "Queued"},
+        "min(creation)"
+    )
+
+    return {
+        "depth": depth,
+        "failed": failed,
+        "lag_seconds": time_diff_in_seconds(now_datetime(), oldest) if oldest else 0
+    }
@@ -1,9 +1,41 @@
-
 import frappe
 from frappe import _
+from frappe.model.naming import make_autoname
+from frappe.utils import now_datetime
 from datetime import datetime
+from hrms.hr.doctype.shift_assignment.shift_assignment import get_actual_start_end_datetime_of_shift
+from psc_hrms.apis.employee_cache import get_employees
+from psc_hrms.apis.instrumentation import instrument
+from psc_hrms.apis.punch_queue import queue_events
+from psc_hrms.apis.presence_index import mark_present
+from psc_hrms.apis.attendance_rollup import add_punches, get_rollups, lock_attendance_days
+
+# Number of events written per transaction by the bulk endpoint
+BULK_CHUNK_SIZE = 200
+
+# Column order of the COSEC `event-ta` pipe-delimited response
+COSEC_EVENT_FIELDS = (
+    "index_no",
+    "user_id",
+    "user_name",
+    "event_date_time",
+    "entry_exit_type",
+    "master_controller_id",
+    "door_controller_id",
+    "special_function_id",
+    "leave_dt",
+    "i_date_time",
+)
+
+CHECKIN_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "employee", "employee_name", "log_type", "time", "device_id", "custom_checkin_synced",
+    "custom_cosec_index_no",
+    "shift", "shift_start", "shift_end", "shift_actual_start", "shift_actual_end",
+)
 
 @frappe.whitelist(allow_guest=False)
+@instrument()
 def get_staff():
     try:
         employees = frappe.get_all("Employee", fields=[
@@ -15,78 +47,296 @@ def get_staff():
         return {"error": str(e)}
 
 @frappe.whitelist(allow_guest=False)
+@instrument()
 def createAttendanceAndCheckins(data):
     try:
         data = frappe.parse_json(data)
-        event_dt = datetime.strptime(data.get("event_date_time"), "%d/%m/%Y %H:%M:%S")
-        formatted_time = event_dt.strftime("%d-%m-%Y %H:%M:%S")
-        attendance_date = event_dt.date()
-        entry_type = "IN" if data.get("entry_exit_type") == "0" else "OUT"
-
-        # 1. Grab raw input (e.g. "PSC-00028")
-        raw_emp_number = data.get("user_id")
-        if not raw_emp_number:
-            return {"error": "No user_id provided"}
-        
-        # 2. Remove any hyphens → "PSC00028"
-        clean_emp_number = raw_emp_number.replace("-", "")
-        prefix = clean_emp_number[:3]
-        suffix = clean_emp_number[3:]
-        formatted_emp_number = f"{prefix}-{suffix}"
-
-        # 4. Fetch employee details using the reformatted number:
-        employee = frappe.get_value(
-            "Employee",
-            {"employee_number": formatted_emp_number},
-            ["name", "employee_name", "company", "department"],
-            as_dict=True
-        )
-        if not employee:
-            return {"error": f"Employee {formatted_emp_number} not found"}
-
-        # 5. Check if Attendance already exists for that date:
-        attendance = frappe.db.exists("Attendance", {
-            "employee": employee.name,
-            "attendance_date": attendance_date
-        })
-
-        created_attendance = None
-        if not attendance and entry_type == "IN":
-            attendance_doc = frappe.get_doc({
-                "doctype": "Attendance",
-                "employee": employee.name,
-                "employee_name": employee.employee_name,
-                "attendance_date": attendance_date,
-                "custom_time_in": formatted_time,
-                "company": employee.company,
-                "department": employee.department,
-                "status": "Present"
-            })
-            attendance_doc.insert()
-            attendance_doc.submit()
-            created_attendance = attendance_doc.name
-            attendance = created_attendance
-
-        # 6. Build the Employee Checkin record:
-        checkin_data = {
-            "doctype": "Employee Checkin",
-            "employee": employee.name,
-            "employee_name": employee.employee_name,
-            "log_type": entry_type,
-            "time": formatted_time,
-            "device_id": data.get("master_controller_id"),
-            "custom_checkin_synced": 1
-        }
-        
-        checkin_doc = frappe.get_doc(checkin_data)
-        checkin_doc.insert()
-
-        # 7. If this is an “OUT” record, update the existing Attendance’s out_time:
-        if entry_type == "OUT" and attendance:
-            frappe.db.set_value("Attendance", attendance, "custom_time_out", formatted_time)
-
-        return {"success": True, "attendance": attendance}
+        result = _ingest_events([data])[0]
+        result.pop("index_no", None)
+        return result
 
     except Exception as e:
         frappe.log_error(_("Attendance Sync Error"), e)
         return {"error": str(e)}
+
+@frappe.whitelist(allow_guest=False)
+@instrument()
+def createAttendanceAndCheckinsBulk(events):
+    """
+    Batch variant of createAttendanceAndCheckins.
+
+    `events` is either a JSON array of COSEC event dicts or the raw
+    pipe-delimited `event-ta` text (header line first). Returns one result
+    per event, in input order.
+    """
+    try:
+        events = parse_cosec_events(events)
+        return {"success": True, "results": _ingest_events(events)}
+
+    except Exception as e:
+        frappe.log_error(_("Attendance Bulk Sync Error"), e)
+        return {"error": str(e)}
+
+@frappe.whitelist(allow_guest=False)
+@instrument()
+def queueAttendanceEvents(events):
+    """
+    Non-blocking variant of createAttendanceAndCheckinsBulk: validates the
+    events, appends them to the Attendance Punch Queue and returns immediately.
+    """
+    try:
+        events = parse_cosec_events(events)
+        return {"success": True, "results": queue_events(events)}
+
+    except Exception as e:
+        frappe.log_error(_("Attendance Queue Error"), e)
+        return {"error": str(e)}
+
+def parse_cosec_events(events):
+    """
+    Normalise the bulk payload into a list of event dicts. Malformed raw
+    lines are kept as None so the result vector stays aligned with the input.
+    """
+    if isinstance(events, str):
+        text = events.strip()
+        if text.startswith("["):
+            return frappe.parse_json(text)
+
+        parsed = []
+        # First line of the COSEC response is the column header
+        for line in text.splitlines()[1:]:
+            if not line.strip():
+                continue
+            parts = line.split("|")
+            if len(parts) < len(COSEC_EVENT_FIELDS):
+                parsed.append(None)
+                continue
+            parsed.append(dict(zip(COSEC_EVENT_FIELDS, parts)))
+        return parsed
+
+    return list(events or [])
+
+def format_employee_number(raw_emp_number):
+    """
+    COSEC user ids drop the hyphen ("PSC00028"); Employee.employee_number
+    keeps it after the 3-char prefix ("PSC-00028").
+    """
+    clean_emp_number = raw_emp_number.replace("-", "")
+    prefix = clean_emp_number[:3]
+    suffix = clean_emp_number[3:]
+    return f"{prefix}-{suffix}"
+
+def _parse_event(data):
+    """
+    Validate a single COSEC event and derive the values needed for ingestion.
+    """
+    if not data:
+        raise frappe.ValidationError(_("Malformed COSEC event"))
+
+    raw_emp_number = data.get("user_id")
+    if not raw_emp_number:
+        raise frappe.ValidationError(_("No user_id provided"))
+
+    event_dt = datetime.strptime(data.get("event_date_time"), "%d/%m/%Y %H:%M:%S")
+    return frappe._dict({
+        "index_no": data.get("index_no"),
+        "employee_number": format_employee_number(raw_emp_number),
+        "event_dt": event_dt,
+        "formatted_time": event_dt.strftime("%d-%m-%Y %H:%M:%S"),
+        "attendance_date": event_dt.date(),
+        "entry_type": "IN" if data.get("entry_exit_type") == "0" else "OUT",
+        # Never NULL, so the (employee, time, device_id, log_type) unique key applies
+        "device_id": data.get("master_controller_id") or "",
+    })
+
+def _get_attendance_map(events):
+    """
+    Existing Attendance names keyed by (employee, attendance_date) for a chunk.
+    """
+    employees = {event.employee.name for event in events}
+    dates = {event.attendance_date for event in events}
+    if not employees:
+        return {}
+
+    rows = frappe.get_all(
+        "Attendance",
+        filters={
+            "employee": ["in", list(employees)],
+            "attendance_date": ["in", list(dates)],
+            "docstatus": ["!=", 2]
+        },
+        fields=["name", "employee", "attendance_date"]
+    )
+    return {(row.employee, row.attendance_date): row.name for row in rows}
+
+def _punch_key(employee, time, device_id, log_type):
+    return (employee, time, device_id or "", log_type)
+
+def _get_existing_punches(events):
+    """
+    Keys of Employee Checkins already stored for a chunk, fetched in one query
+    so only the missing punches are inserted.
+    """
+    employees = {event.employee.name for event in events}
+    if not employees:
+        return set()
+
+    rows = frappe.get_all(
+        "Employee Checkin",
+        filters=[
+            ["employee", "in", list(employees)],
+            ["time", ">=", min(event.event_dt for event in events)],
+            ["time", "<=", max(event.event_dt for event in events)]
+        ],
+        fields=["employee", "time", "device_id", "log_type"]
+    )
+    return {_punch_key(row.employee, row.time, row.device_id, row.log_type) for row in rows}
+
+def _get_shift_fields(shifts, employee, time):
+    """
+    The shift columns EmployeeCheckin.fetch_shift would set, which bulk_insert
+    skips. `shifts` caches each employee's last shift: punches inside its
+    actual start/end window resolve to it without another lookup.
+    """
+    timings = shifts.get(employee)
+    if not (timings and timings.actual_start <= time <= timings.actual_end):
+        timings = shifts[employee] = get_actual_start_end_datetime_of_shift(employee, time, True)
+    if not timings:
+        return (None, None, None, None, None)
+    return (
+        timings.shift_type.name, timings.start_datetime, timings.end_datetime,
+        timings.actual_start, timings.actual_end,
+    )
+
+def _ingest_events(events):
+    """
+    Create Attendance and Employee Checkin rows for a list of COSEC events.
+    Each chunk of BULK_CHUNK_SIZE events is written in its own transaction;
+    a failing event is rolled back to its savepoint without affecting the rest.
+    Concurrent calls are safe: a chunk holds the Daily Attendance Rollup row
+    locks of all its employee-days while it creates Attendance and checkins.
+
+    Errors that may pass on a retry (a rolled back chunk, a lock wait or other
+    database error) carry `"retryable": True`; validation errors do not.
+    """
+    results = [None] * len(events)
+    parsed = {}
+
+    for idx, data in enumerate(events):
+        try:
+            parsed[idx] = _parse_event(data)
+        except Exception as e:
+            results[idx] = {"index_no": (data or {}).get("index_no"), "error": str(e)}
+
+    employees = get_employees({event.employee_number for event in parsed.values()})
+    for idx, event in list(parsed.items()):
+        event.employee = employees.get(event.employee_number)
+        if not event.employee:
+            results[idx] = {"index_no": event.index_no, "error": f"Employee {event.employee_number} not found"}
+            del parsed[idx]
+
+    indexes = sorted(parsed)
+    for start in range(0, len(indexes), BULK_CHUNK_SIZE):
+        chunk = [(idx, parsed[idx]) for idx in indexes[start:start + BULK_CHUNK_SIZE]]
+        try:
+            _ingest_chunk(chunk, results)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(_("Attendance Sync Error"), e)
+            for idx, event in chunk:
+                results[idx] = {"index_no": event.index_no, "error": str(e), "retryable": True}
+
+    return results
+
+def _ingest_chunk(chunk, results):
+    events = [event for _idx, event in chunk]
+    # Every employee-day of the chunk is locked in one sorted pass before anything is written,
+    # so concurrent writers queue on their first shared day instead of deadlocking later
+    locked_days = lock_attendance_days({(event.employee.name, event.attendance_date) for event in events})
+    # Plain reads: a locking range read would gap-lock Attendance and Employee Checkin and make
+    # chunks on unrelated days wait on each other. The link read under the row lock is current,
+    # and checkins committed since this snapshot are dropped by the unique punch key on insert
+    attendance_map = _get_attendance_map(events)
+    attendance_map.update({key: attendance for key, attendance in locked_days.items() if attendance})
+    seen = _get_existing_punches(events)
+    checkin_rows = []
+    punches = []
+    out_days = {}
+    now = now_datetime()
+    checkin_autoname = frappe.get_meta("Employee Checkin").autoname or "hash"
+    shifts = {}
+
+    for idx, event in chunk:
+        employee = event.employee
+        key = (employee.name, event.attendance_date)
+        punch = _punch_key(employee.name, event.event_dt, event.device_id, event.entry_type)
+        if punch in seen:
+            # Already ingested by an earlier or overlapping run
+            results[idx] = {
+                "index_no": event.index_no, "success": True,
+                "attendance": attendance_map.get(key), "duplicate": True
+            }
+            continue
+
+        frappe.db.savepoint("cosec_event")
+        try:
+            attendance = attendance_map.get(key)
+            if not attendance and event.entry_type == "IN":
+                attendance_doc = frappe.get_doc({
+                    "doctype": "Attendance",
+                    "employee": employee.name,
+                    "employee_name": employee.employee_name,
+                    "attendance_date": event.attendance_date,
+                    "custom_time_in": event.formatted_time,
+                    "company": employee.company,
+                    "department": employee.department,
+                    "status": "Present"
+                })
+                attendance_doc.insert()
+                attendance_doc.submit()
+                # on_submit links it on the rollup row, for the next writer waiting on this day
+                attendance = attendance_map[key] = attendance_doc.name
+
+            checkin_name = make_autoname(checkin_autoname, "Employee Checkin")
+            checkin_rows.append((
+                checkin_name,
+                now, now, frappe.session.user, frappe.session.user, 0,
+                employee.name, employee.employee_name, event.entry_type,
+                event.event_dt, event.device_id, 1, event.index_no,
+                *_get_shift_fields(shifts, employee.name, event.event_dt),
+            ))
+            punches.append((idx, checkin_name, (employee.name, event.event_dt, event.entry_type, event.device_id)))
+            seen.add(punch)
+
+            if event.entry_type == "OUT" and attendance:
+                out_days[key] = attendance
+
+            results[idx] = {"index_no": event.index_no, "success": True, "attendance": attendance}
+        except Exception as e:
+            frappe.db.rollback(save_point="cosec_event")
+            results[idx] = {
+                "index_no": event.index_no, "error": str(e),
+                "retryable": not isinstance(e, frappe.ValidationError)
+            }
+
+    if checkin_rows:
+        # ignore_duplicates covers punches inserted outside ingestion since the lookup
+        frappe.db.bulk_insert("Employee Checkin", CHECKIN_FIELDS, checkin_rows, ignore_duplicates=True)
+        # Only the rows that made it in are counted; the others are already in the rollup
+        inserted = set(frappe.get_all(
+            "Employee Checkin", filters={"name": ["in", [row[0] for row in checkin_rows]]}, pluck="name"
+        ))
+        for idx, checkin_name, _punch in punches:
+            if checkin_name not in inserted:
+                results[idx]["duplicate"] = True
+        punches = [punch for _idx, checkin_name, punch in punches if checkin_name in inserted]
+        mark_present((employee, time) for employee, time, _log_type, _device_id in punches)
+        add_punches(punches)
+
+    # custom_time_out follows the rollup's last OUT, so late or out-of-order punches cannot move it back
+    for key, rollup in get_rollups(out_days).items():
+        if rollup.last_out:
+            frappe.db.set_value(
+                "Attendance", out_days[key], "custom_time_out", rollup.last_out.strftime("%d-%m-%Y %H:%M:%S")
+            )
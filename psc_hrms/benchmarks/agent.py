@@ -0,0 +1,114 @@
+"""
+Benchmark of the local sync agent (psc_hrms/apis/attendance_sync.py) against
+the fake COSEC server.
+
+    python -m psc_hrms.benchmarks.agent --employees 500 --events 4 --shape burst
+    python -m psc_hrms.benchmarks.agent --frappe-url http://localhost:8000 --report agent.json
+
+Without --frappe-url the fake server also stubs the Frappe endpoints, so the
+numbers cover fetching, parsing, batching and checkpointing only. With it,
+uploads go to a real site (FRAPPE_API_KEY/FRAPPE_API_SECRET from the
+environment), and the employees come from that site.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from psc_hrms.apis import attendance_sync
+from psc_hrms.benchmarks.fake_cosec import SHAPES, FakeCosecServer
+from psc_hrms.benchmarks.utils import make_report, rate, summarize_latencies, write_report
+
+
+def run_agent_benchmark(employees=200, events_per_day=4, shape="shift_change", cosec_latency_ms=0,
+                        frappe_url=None, report_path=None):
+    params = {
+        "employees": employees, "events_per_day": events_per_day, "shape": shape,
+        "cosec_latency_ms": cosec_latency_ms, "frappe_url": frappe_url,
+        "fetch_concurrency": attendance_sync.FETCH_CONCURRENCY,
+        "upload_concurrency": attendance_sync.UPLOAD_CONCURRENCY,
+        "upload_batch_size": attendance_sync.UPLOAD_BATCH_SIZE,
+    }
+    server = FakeCosecServer(
+        events_per_day=events_per_day, shape=shape, latency_ms=cosec_latency_ms,
+        stub_frappe=not frappe_url, employees=employees
+    ).start()
+
+    fetch_times = []
+    upload_times = []
+    event_upload_times = []
+    original = {
+        name: getattr(attendance_sync, name)
+        for name in ("COSEC_URL", "FRAPPE_URL", "CHECKPOINT_FILE", "fetch_events", "BatchUploader")
+    }
+
+    def timed_fetch(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original["fetch_events"](*args, **kwargs)
+        finally:
+            fetch_times.append(time.perf_counter() - start)
+
+    class TimedBatchUploader(original["BatchUploader"]):
+        def upload(self, batch):
+            start = time.perf_counter()
+            try:
+                return super().upload(batch)
+            finally:
+                elapsed = time.perf_counter() - start
+                upload_times.append(elapsed)
+                # every event of the batch waits for the whole request
+                event_upload_times.extend([elapsed] * len(batch))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        attendance_sync.COSEC_URL = server.url
+        attendance_sync.FRAPPE_URL = frappe_url or server.url
+        attendance_sync.CHECKPOINT_FILE = os.path.join(tmp, "checkpoint.json")
+        attendance_sync.fetch_events = timed_fetch
+        attendance_sync.BatchUploader = TimedBatchUploader
+        try:
+            start = time.perf_counter()
+            attendance_sync.main()
+            first_run = time.perf_counter() - start
+
+            # second run: everything is behind the checkpoint, nothing is uploaded
+            start = time.perf_counter()
+            attendance_sync.main()
+            idle_run = time.perf_counter() - start
+        finally:
+            for name, value in original.items():
+                setattr(attendance_sync, name, value)
+            server.stop()
+
+    events = len(event_upload_times)
+    results = {
+        "events": events,
+        "wall_time_s": round(first_run, 3),
+        "events_per_sec": rate(events, first_run),
+        "idle_run_wall_time_s": round(idle_run, 3),
+        "cosec_fetch": summarize_latencies(fetch_times),
+        "upload_batch": summarize_latencies(upload_times),
+        "event_upload_latency": summarize_latencies(event_upload_times),
+        "server": server.stats,
+    }
+    return write_report(make_report("attendance_sync_agent", params, results), report_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=200, help="staff returned by the stubbed get_staff")
+    parser.add_argument("--events", type=int, default=4, help="events per employee per day")
+    parser.add_argument("--shape", choices=SHAPES, default="shift_change")
+    parser.add_argument("--cosec-latency-ms", type=float, default=0)
+    parser.add_argument("--frappe-url", help="upload to this site instead of the stub")
+    parser.add_argument("--report", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    run_agent_benchmark(
+        employees=args.employees, events_per_day=args.events, shape=args.shape,
+        cosec_latency_ms=args.cosec_latency_ms, frappe_url=args.frappe_url, report_path=args.report
+    )
+
+
+if __name__ == "__main__":
+    main()
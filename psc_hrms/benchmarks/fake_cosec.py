@@ -0,0 +1,212 @@
+"""
+Local stand-in for the COSEC `event-ta` API, for benchmarking the attendance
+pipeline without a controller.
+
+    python -m psc_hrms.benchmarks.fake_cosec --port 8085 --events 4 --shape shift_change
+
+Events are generated deterministically per (user, day), so repeated fetches
+return the same punches, as the real controller does. With `--stub-frappe`
+the server also answers `get_staff` and the bulk upload endpoint, which
+measures attendance_sync on its own.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+EVENT_HEADER = "IndexNo|UserID|UserName|EventDateTime|EntryExitType|MasterControllerID|DoorControllerID|SpecialFunctionID|LeaveDT|IDateTime"
+
+# Burst shapes: minutes after midnight the punches are drawn around
+SHAPES = ("uniform", "shift_change", "burst")
+
+STAFF_METHOD = "/api/method/psc_hrms.apis.staff_attendance.get_staff"
+BULK_SYNC_METHOD = "/api/method/psc_hrms.apis.staff_attendance.createAttendanceAndCheckinsBulk"
+
+
+def _event_times(rng, day, count, shape):
+    start = datetime(day.year, day.month, day.day)
+    if shape == "uniform":
+        # spread over 06:00-22:00
+        offsets = [rng.uniform(6 * 3600, 22 * 3600) for _i in range(count)]
+    elif shape == "burst":
+        # everyone within the same minute: worst case for same-second punches
+        offsets = [7 * 3600 + rng.randint(0, 59) for _i in range(count)]
+    else:
+        # IN punches around 07:00, OUT punches around 17:00 (sigma 5 minutes)
+        offsets = [
+            rng.gauss((7 if i % 2 == 0 else 17) * 3600, 300)
+            for i in range(count)
+        ]
+    return sorted(start + timedelta(seconds=int(offset)) for offset in offsets)
+
+
+def generate_events(user_id, day, count, shape="shift_change", seed=0, device_id="1"):
+    """
+    `count` COSEC events for one user and day, as dicts keyed like the
+    pipe-delimited columns. Punches alternate IN ("0") and OUT ("1").
+    """
+    user_id = user_id.replace("-", "")
+    rng = random.Random(f"{seed}:{user_id}:{day.isoformat()}")
+    # unique per (user, day, punch) for up to 1000 punches a day
+    base_index = (zlib.crc32(user_id.encode()) % 100000) * 1000000 + (day.toordinal() % 1000) * 1000
+    return [
+        {
+            "index_no": str(base_index + i),
+            "user_id": user_id,
+            "user_name": f"Bench {user_id}",
+            "event_date_time": event_dt.strftime("%d/%m/%Y %H:%M:%S"),
+            "entry_exit_type": "0" if i % 2 == 0 else "1",
+            "master_controller_id": device_id,
+            "door_controller_id": "1",
+            "special_function_id": "0",
+            "leave_dt": "",
+            "i_date_time": event_dt.strftime("%d/%m/%Y %H:%M:%S"),
+        }
+        for i, event_dt in enumerate(_event_times(rng, day, count, shape))
+    ]
+
+
+def format_events(events):
+    """
+    Render events in the `event-ta` text format, header line first.
+    """
+    lines = [EVENT_HEADER]
+    for event in events:
+        lines.append("|".join([
+            event["index_no"], event["user_id"], event["user_name"], event["event_date_time"],
+            event["entry_exit_type"], event["master_controller_id"], event["door_controller_id"],
+            event["special_function_id"], event["leave_dt"], event["i_date_time"],
+        ]))
+    return "\n".join(lines)
+
+
+def _parse_date_range(value):
+    start, _sep, end = value.partition("-")
+    start = datetime.strptime(start, "%d%m%Y").date()
+    end = datetime.strptime(end or value, "%d%m%Y").date()
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class FakeCosecServer:
+    """
+    Threaded HTTP server; start() returns once it is listening.
+    """
+
+    def __init__(self, port=0, events_per_day=4, shape="shift_change", latency_ms=0,
+                 seed=0, stub_frappe=False, employees=100):
+        if shape not in SHAPES:
+            raise ValueError(f"shape must be one of {SHAPES}")
+        self.events_per_day = events_per_day
+        self.shape = shape
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+        self.stub_frappe = stub_frappe
+        self.employees = employees
+        self.stats = {"cosec_requests": 0, "events_served": 0, "uploads": 0, "events_uploaded": 0}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def event_ta(self, query):
+        params = dict(part.split("=", 1) for part in unquote(query).split(";") if "=" in part)
+        user_id = params.get("Id", "")
+        events = []
+        for day in _parse_date_range(params.get("date-range", datetime.now().strftime("%d%m%Y"))):
+            events.extend(generate_events(user_id, day, self.events_per_day, self.shape, self.seed))
+        return events
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type="text/plain"):
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/cosec/api.svc/v2/event-ta":
+                    if server.latency:
+                        time.sleep(server.latency)
+                    events = server.event_ta(url.query)
+                    server.count(cosec_requests=1, events_served=len(events))
+                    self._send(format_events(events))
+                elif server.stub_frappe and url.path == STAFF_METHOD:
+                    employees = [
+                        {"name": f"HR-EMP-{i:05d}", "employee_number": f"PSC-{i:05d}"}
+                        for i in range(1, server.employees + 1)
+                    ]
+                    self._send(json.dumps({"message": {"employees": employees}}), "application/json")
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                if not (server.stub_frappe and url.path == BULK_SYNC_METHOD):
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                events = json.loads(body or b"{}").get("events", [])
+                server.count(uploads=1, events_uploaded=len(events))
+                results = [{"index_no": event.get("index_no"), "success": True} for event in events]
+                self._send(json.dumps({"message": {"success": True, "results": results}}), "application/json")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--events", type=int, default=4, help="events per user per day")
+    parser.add_argument("--shape", choices=SHAPES, default="shift_change")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated controller response time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-frappe", action="store_true", help="also answer get_staff and the bulk upload")
+    parser.add_argument("--employees", type=int, default=100, help="staff returned by the stubbed get_staff")
+    args = parser.parse_args()
+
+    server = FakeCosecServer(
+        port=args.port, events_per_day=args.events, shape=args.shape, latency_ms=args.latency_ms,
+        seed=args.seed, stub_frappe=args.stub_frappe, employees=args.employees
+    ).start()
+    print(f"Fake COSEC listening on {server.url}")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+In-process benchmark of attendance ingestion on a bench site (use a test
+site: it writes Attendance and Employee Checkins for real employees).
+
+    bench --site test.localhost execute psc_hrms.benchmarks.ingestion.run_ingestion_benchmark \\
+        --kwargs "{'employees': 200, 'events_per_employee': 4, 'mode': 'bulk', 'report_path': '/tmp/ingest.json'}"
+
+`mode` is "single" (one createAttendanceAndCheckins call per event, as the
+agent used to upload) or "bulk" (createAttendanceAndCheckinsBulk in batches
+of `batch_size`). Punches are written with device_id BENCH_DEVICE_ID and,
+with `cleanup`, removed afterwards along with the Attendance they created.
+"""
+import time
+
+import frappe
+from frappe.utils import add_days, getdate, today
+
+from psc_hrms.apis.attendance_rollup import link_attendance, recompute_days
+from psc_hrms.apis.instrumentation import track_queries
+from psc_hrms.apis.presence_index import refresh_presence
+from psc_hrms.apis.staff_attendance import createAttendanceAndCheckins, createAttendanceAndCheckinsBulk
+from psc_hrms.benchmarks.fake_cosec import generate_events
+from psc_hrms.benchmarks.utils import make_report, rate, summarize_latencies, write_report
+
+BENCH_DEVICE_ID = "BENCH"
+
+
+def run_ingestion_benchmark(employees=50, events_per_employee=4, shape="shift_change", mode="bulk",
+                            batch_size=500, attendance_date=None, cleanup=True, report_path=None):
+    if mode not in ("single", "bulk"):
+        frappe.throw("mode must be 'single' or 'bulk'")
+
+    day = getdate(attendance_date or add_days(today(), -1))
+    staff = frappe.get_all(
+        "Employee",
+        filters={"status": "Active", "employee_number": ["is", "set"]},
+        fields=["name", "employee_number"],
+        order_by="name asc",
+        limit=employees
+    )
+    if not staff:
+        frappe.throw("No active employees with an employee_number on this site")
+
+    events = [
+        event
+        for emp in staff
+        for event in generate_events(emp.employee_number, day, events_per_employee, shape, device_id=BENCH_DEVICE_ID)
+    ]
+    employee_names = [emp.name for emp in staff]
+    existing_attendance = set(frappe.get_all(
+        "Attendance", filters={"employee": ["in", employee_names], "attendance_date": day}, pluck="name"
+    ))
+
+    latencies = []
+    results = []
+    with track_queries() as queries:
+        start = time.perf_counter()
+        if mode == "single":
+            for event in events:
+                call_start = time.perf_counter()
+                results.append(createAttendanceAndCheckins(dict(event)))
+                latencies.append(time.perf_counter() - call_start)
+        else:
+            for i in range(0, len(events), batch_size):
+                batch = events[i:i + batch_size]
+                call_start = time.perf_counter()
+                response = createAttendanceAndCheckinsBulk([dict(event) for event in batch])
+                elapsed = time.perf_counter() - call_start
+                # every event of the batch waits for the whole call
+                latencies.extend([elapsed] * len(batch))
+                results.extend(response.get("results") or [response] * len(batch))
+        wall_time = time.perf_counter() - start
+
+    failures = [result for result in results if not (result and result.get("success"))]
+    report = make_report("attendance_ingestion", {
+        "employees": len(staff), "events_per_employee": events_per_employee, "shape": shape,
+        "mode": mode, "batch_size": batch_size, "attendance_date": str(day),
+    }, {
+        "events": len(events),
+        "failed": len(failures),
+        "first_error": failures[0].get("error") if failures else None,
+        "wall_time_s": round(wall_time, 3),
+        "events_per_sec": rate(len(events), wall_time),
+        "event_latency": summarize_latencies(latencies),
+        "queries": queries["queries"],
+        "queries_per_event": round(queries["queries"] / len(events), 2),
+        "query_time_share": round(queries["query_time"] / wall_time, 3) if wall_time else None,
+    })
+
+    if cleanup:
+        _cleanup(staff, day, existing_attendance)
+    return write_report(report, report_path)
+
+
+def _cleanup(staff, day, existing_attendance):
+    """
+    Remove the benchmark punches, the Attendance they created and any queued
+    copies, then recompute the day's Daily Attendance Rollup rows and presence
+    bits from what is left, so the next run starts from the same state.
+    """
+    employee_names = [emp.name for emp in staff]
+    frappe.db.delete("Employee Checkin", {"employee": ["in", employee_names], "device_id": BENCH_DEVICE_ID})
+    created = set(frappe.get_all(
+        "Attendance", filters={"employee": ["in", employee_names], "attendance_date": day}, pluck="name"
+    )) - existing_attendance
+    if created:
+        frappe.db.delete("Attendance", {"name": ["in", list(created)]})
+    frappe.db.delete("Attendance Punch Queue", {
+        "employee_number": ["in", [emp.employee_number for emp in staff]],
+        "event_time": ["between", [day, add_days(day, 1)]],
+    })
+
+    # Rows are dropped first so no link to a deleted Attendance survives, then rebuilt
+    frappe.db.delete("Daily Attendance Rollup", {"employee": ["in", employee_names], "attendance_date": day})
+    recompute_days([(employee, day) for employee in employee_names])
+    link_attendance(day, day)
+    for employee in employee_names:
+        refresh_presence(employee, day)
+    frappe.db.commit()
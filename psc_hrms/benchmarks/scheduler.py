@@ -0,0 +1,243 @@
+"""
+Scaling benchmark of the scheduler jobs in psc_hrms.apis.cron_jobs against
+synthetic organisations (use a test site).
+
+    bench --site test.localhost execute psc_hrms.benchmarks.scheduler.run_scheduler_benchmark \\
+        --kwargs "{'sizes': [50, 500, 2000], 'report_path': '/tmp/scheduler.json'}"
+
+For each headcount the synthetic org is grown to that size (Users,
+Departments with leave approver tables, Employees, one Leave Policy and an
+assignment per employee, all named BENCH-*), then each job runs cold (its
+output from the previous size removed) and warm (nothing left to do).
+Every run records wall time, query count and time, and tracemalloc peak.
+The report ends with a scaling exponent per job: ~1 is linear in headcount.
+"""
+import math
+import time
+import tracemalloc
+from datetime import date
+
+import frappe
+from frappe.utils import get_last_day, now_datetime, today
+
+from psc_hrms.apis.cron_jobs import run_leave_accrual, set_user_permissions
+from psc_hrms.apis.instrumentation import track_queries
+from psc_hrms.benchmarks.utils import make_report, write_report
+
+BENCH_PREFIX = "BENCH"
+BENCH_LEAVE_TYPE = "BENCH Leave"
+EMPLOYEES_PER_DEPARTMENT = 25
+
+JOBS = ("set_user_permissions", "set_leave_days")
+
+
+def run_scheduler_benchmark(sizes=(50, 200, 1000, 2000), jobs=JOBS, keep_data=False, report_path=None):
+    sizes = sorted(int(size) for size in frappe.parse_json(sizes))
+    jobs = list(frappe.parse_json(jobs))
+    company = frappe.get_all("Company", pluck="name", limit=1)
+    if not company:
+        frappe.throw("The site needs at least one Company")
+    company = company[0]
+
+    run_date = get_last_day(today())
+    policy = _ensure_policy(run_date.year)
+    results = []
+    try:
+        for size in sizes:
+            _grow_org(size, company, policy, run_date.year)
+            for job in jobs:
+                for phase in ("cold", "warm"):
+                    if phase == "cold":
+                        _reset_job_output(job)
+                    results.append({"employees": size, "job": job, "phase": phase, **_measure(job, run_date, policy)})
+    finally:
+        if not frappe.parse_json(keep_data):
+            _cleanup()
+
+    report = make_report("scheduler_scaling", {"sizes": sizes, "jobs": jobs, "run_date": str(run_date)}, {
+        "runs": results,
+        "scaling": _scaling(results),
+    })
+    return write_report(report, report_path)
+
+
+def _measure(job, run_date, policy):
+    tracemalloc.start()
+    with track_queries() as queries:
+        start = time.perf_counter()
+        if job == "set_user_permissions":
+            set_user_permissions()
+        elif job == "set_leave_days":
+            # the body of one accrual job, unsharded, limited to the synthetic policy
+            run_leave_accrual(run_date, policies=[policy])
+        else:
+            frappe.throw(f"Unknown job {job}")
+        wall_time = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_time_s": round(wall_time, 3),
+        "queries": queries["queries"],
+        "query_time_s": round(queries["query_time"], 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _scaling(results):
+    """
+    Per job and phase, the exponent k in cost ~ headcount^k between the
+    smallest and largest size, for wall time and query count.
+    """
+    scaling = {}
+    for job in {row["job"] for row in results}:
+        for phase in ("cold", "warm"):
+            runs = sorted((row for row in results if row["job"] == job and row["phase"] == phase),
+                          key=lambda row: row["employees"])
+            if len(runs) < 2:
+                continue
+            first, last = runs[0], runs[-1]
+            growth = math.log(last["employees"] / first["employees"])
+
+            def exponent(metric):
+                if not (first[metric] and last[metric]):
+                    return None
+                return round(math.log(last[metric] / first[metric]) / growth, 2)
+
+            scaling[f"{job}:{phase}"] = {
+                "wall_time_exponent": exponent("wall_time_s"),
+                "query_exponent": exponent("queries"),
+            }
+    return scaling
+
+
+def _bulk_insert(doctype, rows):
+    """
+    Insert synthetic rows without controllers, so setup is fast and fires no hooks.
+    """
+    if not rows:
+        return
+    now = now_datetime()
+    fields = ["creation", "modified", "owner", "modified_by"] + list(rows[0])
+    frappe.db.bulk_insert(
+        doctype, fields,
+        [(now, now, "Administrator", "Administrator", *row.values()) for row in rows]
+    )
+
+
+def _ensure_policy(year):
+    if not frappe.db.exists("Leave Type", BENCH_LEAVE_TYPE):
+        frappe.get_doc({
+            "doctype": "Leave Type",
+            "leave_type_name": BENCH_LEAVE_TYPE,
+            "max_leaves_allowed": 365,
+        }).insert(ignore_permissions=True)
+
+    policy = f"{BENCH_PREFIX}-POLICY-{year}"
+    if not frappe.db.exists("Leave Policy", policy):
+        _bulk_insert("Leave Policy", [{
+            "name": policy, "docstatus": 1, "title": policy, "custom_policy_for_year": year,
+        }])
+        _bulk_insert("Leave Policy Detail", [{
+            "name": f"{policy}-1", "docstatus": 1, "parent": policy, "parenttype": "Leave Policy",
+            "parentfield": "leave_policy_details", "idx": 1,
+            "leave_type": BENCH_LEAVE_TYPE, "annual_allocation": 12,
+        }])
+    return policy
+
+
+def _grow_org(size, company, policy, year):
+    """
+    Add synthetic employees (and their departments, users and assignments) up to `size`.
+    """
+    current = frappe.db.count("Employee", {"name": ["like", f"{BENCH_PREFIX}-EMP-%"]})
+    if current >= size:
+        return
+
+    departments = math.ceil(size / EMPLOYEES_PER_DEPARTMENT)
+    existing_departments = frappe.db.count("Department", {"name": ["like", f"{BENCH_PREFIX}-DEPT-%"]})
+    new_departments = range(existing_departments + 1, departments + 1)
+
+    _bulk_insert("User", [
+        {"name": _approver(d), "email": _approver(d), "first_name": f"Bench Approver {d}",
+         "enabled": 1, "user_type": "Website User"}
+        for d in new_departments
+    ] + [
+        {"name": _user(i), "email": _user(i), "first_name": f"Bench Employee {i}",
+         "enabled": 1, "user_type": "Website User"}
+        for i in range(current + 1, size + 1)
+    ])
+    _bulk_insert("Department", [
+        {"name": _department(d), "department_name": _department(d), "company": company,
+         "parent_department": "All Departments", "is_group": 0}
+        for d in new_departments
+    ])
+    _bulk_insert("Department Approver", [
+        {"name": f"{_department(d)}-approver", "parent": _department(d), "parenttype": "Department",
+         "parentfield": "leave_approvers", "idx": 1, "approver": _approver(d)}
+        for d in new_departments
+    ])
+
+    year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+    employees = []
+    assignments = []
+    for i in range(current + 1, size + 1):
+        d = math.ceil(i / EMPLOYEES_PER_DEPARTMENT)
+        employees.append({
+            "name": _employee(i), "employee_name": f"Bench Employee {i}", "first_name": f"Bench Employee {i}",
+            "employee_number": f"{BENCH_PREFIX}-{i:05d}", "gender": "Male",
+            "date_of_birth": date(1990, 1, 1), "date_of_joining": date(year - 1, 1, 1),
+            "company": company, "department": _department(d), "status": "Active",
+            "user_id": _user(i), "leave_approver": _approver(d),
+        })
+        assignments.append({
+            "name": f"{BENCH_PREFIX}-LPA-{i:05d}", "docstatus": 1, "employee": _employee(i),
+            "company": company, "leave_policy": policy,
+            "effective_from": year_start, "effective_to": year_end, "leaves_allocated": 1,
+        })
+    _bulk_insert("Employee", employees)
+    _bulk_insert("Leave Policy Assignment", assignments)
+    frappe.db.commit()
+
+
+def _reset_job_output(job):
+    employees = f"{BENCH_PREFIX}-EMP-%"
+    if job == "set_user_permissions":
+        frappe.db.sql("""
+            DELETE FROM `tabUser Permission`
+            WHERE user LIKE %(users)s OR for_value LIKE %(employees)s
+        """, {"users": f"{BENCH_PREFIX.lower()}-%@example.com", "employees": employees})
+    elif job == "set_leave_days":
+        for doctype in ("Leave Ledger Entry", "Leave Allocation", "Leave Allocation Balance"):
+            frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE employee LIKE %s", employees)
+    frappe.db.commit()
+
+
+def _cleanup():
+    for job in JOBS:
+        _reset_job_output(job)
+    like = f"{BENCH_PREFIX}-%"
+    frappe.db.sql("DELETE FROM `tabLeave Policy Assignment` WHERE name LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabLeave Policy Detail` WHERE parent LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabLeave Policy` WHERE name LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabEmployee` WHERE name LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabDepartment Approver` WHERE parent LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabDepartment` WHERE name LIKE %s", like)
+    frappe.db.sql("DELETE FROM `tabUser` WHERE name LIKE %s", f"{BENCH_PREFIX.lower()}-%@example.com")
+    frappe.db.commit()
+
+
+def _department(d):
+    return f"{BENCH_PREFIX}-DEPT-{d:04d}"
+
+
+def _employee(i):
+    return f"{BENCH_PREFIX}-EMP-{i:05d}"
+
+
+def _user(i):
+    return f"{BENCH_PREFIX.lower()}-emp-{i:05d}@example.com"
+
+
+def _approver(d):
+    return f"{BENCH_PREFIX.lower()}-approver-{d:04d}@example.com"
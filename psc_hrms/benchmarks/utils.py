@@ -0,0 +1,60 @@
+import json
+import math
+import platform
+from datetime import datetime
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of `values` (0 < pct <= 100); None when empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(seconds):
+    """
+    p50/p99/max of a list of durations in seconds, reported in milliseconds.
+    """
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "count": len(seconds),
+        "p50_ms": ms(percentile(seconds, 50)),
+        "p99_ms": ms(percentile(seconds, 99)),
+        "max_ms": ms(max(seconds) if seconds else None),
+    }
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds else None
+
+
+def make_report(name, params, results):
+    """
+    Common envelope of every benchmark report, so runs can be diffed across releases.
+    """
+    return {
+        "benchmark": name,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "params": params,
+        "results": results,
+    }
+
+
+def write_report(report, path=None):
+    """
+    Print the report and, when `path` is given, also write it there as JSON.
+    """
+    text = json.dumps(report, indent=1, sort_keys=True, default=str)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return report
@@ -19,7 +19,9 @@ after_install = "psc_hrms.apis.helpers.after_install" #Disabled for Automated Al
 
 scheduler_events = {
     "cron": {
-    "*/5 * * * *": "psc_hrms.apis.cron_jobs.set_user_permissions"
+    "0 1 * * *": "psc_hrms.apis.cron_jobs.set_user_permissions",
+    "0 3 * * *": "psc_hrms.apis.leave_balance.fix_leave_balances",
+    "* * * * *": "psc_hrms.apis.punch_queue.enqueue_drain"
     }
 	# "daily": [
 	#	"psc_hrms.apis.cron_jobs.set_leave_days"
@@ -63,6 +65,55 @@ doc_events = {
     #         "psc_hrms.apis.helpers.dispatch_notices"
     #     ]
 	# },
+    "Employee": {
+        "on_update": [
+            "psc_hrms.apis.employee_cache.clear_employee_cache",
+            "psc_hrms.apis.cron_jobs.on_employee_update",
+            "psc_hrms.apis.approver_routing.on_employee_update"
+        ],
+        "after_rename": "psc_hrms.apis.employee_cache.clear_employee_cache",
+        "on_trash": "psc_hrms.apis.employee_cache.clear_employee_cache"
+    },
+    "Email Template": {
+        "on_update": "psc_hrms.apis.email_templates.clear_email_template_cache",
+        "on_trash": "psc_hrms.apis.email_templates.clear_email_template_cache"
+    },
+    "Department": {
+        "on_update": [
+            "psc_hrms.apis.cron_jobs.on_department_update",
+            "psc_hrms.apis.approver_routing.on_department_update"
+        ]
+    },
+    "User": {
+        "on_update": "psc_hrms.apis.approver_routing.on_user_update"
+    },
+    "Leave Allocation": {
+        "on_submit": "psc_hrms.apis.leave_balance.on_allocation_submit",
+        "on_cancel": "psc_hrms.apis.leave_balance.on_allocation_cancel",
+        "on_update_after_submit": "psc_hrms.apis.leave_balance.on_allocation_update_after_submit"
+    },
+    "Leave Ledger Entry": {
+        "after_insert": "psc_hrms.apis.leave_balance.on_ledger_entry_insert"
+    },
+    "Attendance": {
+        "on_submit": [
+            "psc_hrms.apis.presence_index.on_attendance_submit",
+            "psc_hrms.apis.attendance_rollup.on_attendance_submit"
+        ],
+        "on_cancel": [
+            "psc_hrms.apis.presence_index.on_attendance_cancel",
+            "psc_hrms.apis.attendance_rollup.on_attendance_cancel"
+        ],
+        "on_trash": "psc_hrms.apis.attendance_rollup.on_attendance_cancel"
+    },
+    "Employee Checkin": {
+        "after_insert": [
+            "psc_hrms.apis.attendance_rollup.on_checkin_insert",
+            "psc_hrms.apis.presence_index.on_checkin_insert"
+        ],
+        "on_update": "psc_hrms.apis.attendance_rollup.on_checkin_update",
+        "on_trash": "psc_hrms.apis.attendance_rollup.on_checkin_trash"
+    },
     "Public Holiday and Off Days Claim Form": {
         "on_submit": "psc_hrms.psc_hrms.doctype.public_holiday_and_off_days_claim_form.public_holiday_and_off_days_claim_form.notify_supervisor",
         "on_update_after_submit": "psc_hrms.psc_hrms.doctype.public_holiday_and_off_days_claim_form.public_holiday_and_off_days_claim_form.notify_users"
@@ -275,7 +326,7 @@ doc_events = {
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	"Attendance Punch Queue": 7  # days to retain processed punches
+}
 
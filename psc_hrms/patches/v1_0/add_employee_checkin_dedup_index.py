@@ -0,0 +1,29 @@
+import frappe
+
+PUNCH_KEY = ["employee", "time", "device_id", "log_type"]
+
+
+def execute():
+    """
+    Make COSEC ingestion idempotent: drop repeated punches (keeping the
+    oldest row) and add a unique key on (employee, time, device_id, log_type).
+    """
+    frappe.db.sql("""
+        UPDATE `tabEmployee Checkin`
+        SET device_id = ''
+        WHERE device_id IS NULL
+    """)
+
+    frappe.db.sql("""
+        DELETE dup
+        FROM `tabEmployee Checkin` dup
+        JOIN `tabEmployee Checkin` keep
+            ON keep.employee = dup.employee
+            AND keep.time = dup.time
+            AND keep.device_id = dup.device_id
+            AND keep.log_type = dup.log_type
+            AND (keep.creation < dup.creation
+                OR (keep.creation = dup.creation AND keep.name < dup.name))
+    """)
+
+    frappe.db.add_unique("Employee Checkin", PUNCH_KEY, constraint_name="unique_employee_punch")
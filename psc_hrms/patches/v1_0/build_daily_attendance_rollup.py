@@ -0,0 +1,5 @@
+from psc_hrms.apis.attendance_rollup import rebuild_attendance_rollup
+
+
+def execute():
+    rebuild_attendance_rollup()
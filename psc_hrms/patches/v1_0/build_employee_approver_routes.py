@@ -0,0 +1,5 @@
+from psc_hrms.apis.approver_routing import rebuild_approver_routes
+
+
+def execute():
+    rebuild_approver_routes()
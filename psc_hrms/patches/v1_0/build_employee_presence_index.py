@@ -0,0 +1,30 @@
+import frappe
+from psc_hrms.apis.presence_index import get_present_days, rebuild_presence_index
+
+
+def execute():
+    rebuild_presence_index()
+
+    # Flag the claimed dates of existing claims so approvers see them verified
+    rows = frappe.get_all(
+        "Claim Form Reference",
+        filters={"parenttype": "Public Holiday and Off Days Claim Form", "worked_on": ["is", "set"]},
+        fields=["name", "parent", "worked_on"]
+    )
+    claims = dict(frappe.get_all(
+        "Public Holiday and Off Days Claim Form",
+        filters={"name": ["in", list({row.parent for row in rows})], "docstatus": ["<", 2]},
+        fields=["name", "for_staff"],
+        as_list=True
+    )) if rows else {}
+
+    by_claim = {}
+    for row in rows:
+        if claims.get(row.parent):
+            by_claim.setdefault(row.parent, []).append(row)
+
+    for claim, claim_rows in by_claim.items():
+        present = get_present_days(claims[claim], [row.worked_on for row in claim_rows])
+        verified = [row.name for row in claim_rows if row.worked_on in present]
+        if verified:
+            frappe.db.set_value("Claim Form Reference", {"name": ["in", verified]}, "verified", 1, update_modified=False)
@@ -0,0 +1,7 @@
+import frappe
+from psc_hrms.apis.leave_balance import reconcile_leave_balances
+
+
+def execute():
+    frappe.set_user("Administrator")
+    reconcile_leave_balances(fix=True)
@@ -0,0 +1,14 @@
+import frappe
+
+from psc_hrms.apis.attendance_rollup import link_attendance
+
+
+def execute():
+    # Rollup rows still pointing at Attendance that was cancelled or deleted before the hooks existed
+    frappe.db.sql("""
+        UPDATE `tabDaily Attendance Rollup` rollup
+        LEFT JOIN `tabAttendance` att ON att.name = rollup.attendance AND att.docstatus = 1
+        SET rollup.attendance = NULL
+        WHERE rollup.attendance IS NOT NULL AND att.name IS NULL
+    """)
+    link_attendance()
@@ -0,0 +1,10 @@
+import frappe
+
+from psc_hrms.psc_hrms.doctype.public_holiday_and_off_days_claim_form.public_holiday_and_off_days_claim_form import (
+    CLAIM_SERIES_KEY,
+)
+
+
+def execute():
+    # Created up front, so the first claims never race on inserting the tabSeries row
+    frappe.db.sql("INSERT IGNORE INTO `tabSeries` (name, current) VALUES (%s, 0)", CLAIM_SERIES_KEY)
@@ -0,0 +1,19 @@
+import re
+
+import frappe
+from frappe.utils import flt
+
+
+def execute():
+    # Claims filed before eligible_day_count existed only have the "N Day(s)" text
+    for claim in frappe.get_all(
+        "Public Holiday and Off Days Claim Form",
+        filters={"eligible_day_count": ["in", [0, None]], "eligible_days": ["is", "set"]},
+        fields=["name", "eligible_days"]
+    ):
+        days_match = re.search(r"(\d+(\.\d+)?)", claim.eligible_days)
+        if days_match:
+            frappe.db.set_value(
+                "Public Holiday and Off Days Claim Form", claim.name,
+                "eligible_day_count", flt(days_match.group(1)), update_modified=False
+            )
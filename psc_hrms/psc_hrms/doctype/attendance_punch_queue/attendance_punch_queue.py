@@ -0,0 +1,24 @@
+# Copyright (c) 2026, Techsavanna Technology and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+
+# Failed punches are kept longer than processed ones, to be looked at and requeued
+FAILED_RETENTION_DAYS = 30
+
+
+class AttendancePunchQueue(Document):
+	@staticmethod
+	def clear_old_logs(days=7):
+		table = frappe.qb.DocType("Attendance Punch Queue")
+		frappe.db.delete(
+			table,
+			filters=(
+				((table.status == "Processed") & (table.modified < (Now() - Interval(days=days))))
+				| ((table.status == "Failed") & (table.modified < (Now() - Interval(days=max(days, FAILED_RETENTION_DAYS)))))
+			),
+		)
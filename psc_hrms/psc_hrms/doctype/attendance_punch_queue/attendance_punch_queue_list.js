@@ -0,0 +1,16 @@
+// Copyright (c) 2026, Techsavanna Technology and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Attendance Punch Queue"] = {
+    onload(listview) {
+        listview.page.add_action_item(__("Requeue"), () => {
+            const names = listview.get_checked_items(true);
+            frappe
+                .xcall("psc_hrms.apis.punch_queue.requeue_failed_punches", { names })
+                .then((count) => {
+                    frappe.show_alert({ message: __("{0} punch(es) requeued", [count]), indicator: "green" });
+                    listview.refresh();
+                });
+        });
+    }
+};
@@ -0,0 +1,63 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from psc_hrms.apis.punch_queue import drain_punch_queue, queue_events, requeue_failed_punches
+
+
+class TestAttendancePunchQueue(FrappeTestCase):
+	def test_valid_events_are_queued(self):
+		results = queue_events([{
+			"index_no": "90001",
+			"user_id": "PSC00001",
+			"event_date_time": "15/08/2025 08:00:00",
+			"entry_exit_type": "0",
+			"master_controller_id": "1",
+		}])
+
+		self.assertTrue(results[0]["queued"])
+		self.assertEqual(
+			frappe.db.get_value("Attendance Punch Queue", {"index_no": "90001"}, ["employee_number", "status"]),
+			("PSC-00001", "Queued"),
+		)
+
+	def test_invalid_events_are_rejected(self):
+		before = frappe.db.count("Attendance Punch Queue")
+		results = queue_events([None, {"index_no": "90002"}])
+
+		self.assertTrue(all(result.get("error") for result in results))
+		self.assertEqual(frappe.db.count("Attendance Punch Queue"), before)
+
+	def test_transient_failures_are_retried_then_requeued(self):
+		queue_events([{
+			"index_no": "90003",
+			"user_id": "PSC00001",
+			"event_date_time": "15/08/2025 09:00:00",
+			"entry_exit_type": "0",
+			"master_controller_id": "1",
+		}])
+		name = frappe.db.get_value("Attendance Punch Queue", {"index_no": "90003"})
+
+		def drain(error):
+			# the drainer commits per batch; keep the test's transaction open
+			with patch(
+				"psc_hrms.apis.staff_attendance._ingest_events",
+				side_effect=lambda events: [error for _event in events]
+			), patch.object(frappe.db, "commit"):
+				drain_punch_queue()
+
+		drain({"error": "Deadlock found", "retryable": True})
+		row = frappe.db.get_value("Attendance Punch Queue", name, ["status", "attempts", "next_attempt_at"], as_dict=True)
+		self.assertEqual((row.status, row.attempts), ("Queued", 1))
+		self.assertTrue(row.next_attempt_at)
+
+		frappe.db.set_value("Attendance Punch Queue", name, "next_attempt_at", None)
+		drain({"error": "Employee PSC-00001 not found"})
+		self.assertEqual(frappe.db.get_value("Attendance Punch Queue", name, ["status", "attempts"]), ("Failed", 2))
+
+		self.assertEqual(requeue_failed_punches([name]), 1)
+		self.assertEqual(frappe.db.get_value("Attendance Punch Queue", name, ["status", "attempts"]), ("Queued", 0))
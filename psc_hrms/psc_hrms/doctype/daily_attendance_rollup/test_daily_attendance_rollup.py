@@ -0,0 +1,180 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+from threading import Thread
+from unittest.mock import patch
+
+import frappe
+from erpnext.setup.doctype.employee.test_employee import make_employee
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime, getdate
+
+from psc_hrms.apis.attendance_rollup import add_punches, lock_attendance_days, rollup_name, set_rollup_attendance
+from psc_hrms.apis.staff_attendance import _ingest_chunk
+
+
+class TestDailyAttendanceRollup(FrappeTestCase):
+	def test_out_of_order_batches_give_same_rollup(self):
+		employee = make_employee("rollup_staff@example.com", company="_Test Company")
+		punches = [
+			(employee, "2026-03-02 07:00:00", "IN", "1"),
+			(employee, "2026-03-02 12:00:00", "OUT", "1"),
+			(employee, "2026-03-02 13:00:00", "IN", "2"),
+			(employee, "2026-03-02 17:30:00", "OUT", "2"),
+		]
+
+		# later punches first, split over two calls
+		add_punches(punches[2:])
+		add_punches(punches[:2])
+
+		rollup = frappe.get_doc("Daily Attendance Rollup", rollup_name(employee, "2026-03-02"))
+		self.assertEqual(rollup.first_in, get_datetime("2026-03-02 07:00:00"))
+		self.assertEqual(rollup.last_out, get_datetime("2026-03-02 17:30:00"))
+		self.assertEqual(rollup.punch_count, 4)
+		self.assertEqual(rollup.worked_seconds, (5 + 4.5) * 3600)
+		self.assertEqual(sorted(rollup.devices.split(",")), ["1", "2"])
+
+	def test_lock_returns_linked_attendance(self):
+		employee = make_employee("rollup_lock@example.com", company="_Test Company")
+		key = (employee, getdate("2026-03-03"))
+
+		self.assertEqual(lock_attendance_days([key]), {key: None})
+
+		set_rollup_attendance(*key, "HR-ATT-TEST-0001")
+		self.assertEqual(lock_attendance_days([key]), {key: "HR-ATT-TEST-0001"})
+
+	def test_lock_blocks_other_connections_on_the_same_day(self):
+		locked = ("_T-Rollup-Race", getdate("2026-03-04"))
+		free = ("_T-Rollup-Race", getdate("2026-03-05"))
+		lock_attendance_days([locked])
+
+		# a second connection waits on the held day and times out, but takes other days freely
+		self.assertFalse(_lock_in_new_connection([locked]))
+		self.assertTrue(_lock_in_new_connection([free]))
+
+	def test_ingestion_counts_only_inserted_checkins(self):
+		employee = make_employee("rollup_dup@example.com", company="_Test Company")
+		frappe.get_doc({
+			"doctype": "Employee Checkin",
+			"employee": employee,
+			"log_type": "OUT",
+			"time": "2026-03-06 17:00:00",
+			"device_id": "1"
+		}).insert()
+
+		event = frappe._dict({
+			"index_no": "1",
+			"employee": frappe.get_cached_doc("Employee", employee),
+			"event_dt": get_datetime("2026-03-06 17:00:00"),
+			"formatted_time": "06-03-2026 17:00:00",
+			"attendance_date": getdate("2026-03-06"),
+			"entry_type": "OUT",
+			"device_id": "1",
+		})
+		results = [None]
+		# the lookup misses the checkin, as when it is committed between lookup and insert
+		with patch("psc_hrms.apis.staff_attendance._get_existing_punches", return_value=set()):
+			_ingest_chunk([(0, event)], results)
+
+		self.assertTrue(results[0]["duplicate"])
+		self.assertEqual(
+			frappe.db.get_value("Daily Attendance Rollup", rollup_name(employee, "2026-03-06"), "punch_count"), 1
+		)
+
+	def test_checkin_edit_and_delete_recompute_the_day(self):
+		employee = make_employee("rollup_edit@example.com", company="_Test Company")
+		checkins = [
+			frappe.get_doc({
+				"doctype": "Employee Checkin", "employee": employee, "log_type": log_type, "time": time
+			}).insert()
+			for log_type, time in (("IN", "2026-03-09 08:00:00"), ("OUT", "2026-03-09 16:00:00"), ("", "2026-03-09 12:00:00"))
+		]
+		name = rollup_name(employee, "2026-03-09")
+		# the punch without a log_type is counted but is not an OUT
+		self.assertEqual(frappe.db.get_value("Daily Attendance Rollup", name, ["punch_count", "out_count"]), (3, 1))
+
+		checkins[1].time = get_datetime("2026-03-09 17:00:00")
+		checkins[1].save()
+		self.assertEqual(frappe.db.get_value("Daily Attendance Rollup", name, "worked_seconds"), 9 * 3600)
+
+		checkins[1].delete()
+		rollup = frappe.db.get_value("Daily Attendance Rollup", name, ["punch_count", "last_out"], as_dict=True)
+		self.assertEqual((rollup.punch_count, rollup.last_out), (2, None))
+
+	def test_ingested_checkins_get_their_shift(self):
+		if not frappe.db.exists("Shift Type", "_Test Ingest Shift"):
+			frappe.get_doc({
+				"doctype": "Shift Type", "name": "_Test Ingest Shift", "start_time": "08:00:00", "end_time": "17:00:00"
+			}).insert()
+		employee = make_employee("rollup_shift@example.com", company="_Test Company")
+		frappe.db.set_value("Employee", employee, "default_shift", "_Test Ingest Shift")
+
+		event = frappe._dict({
+			"index_no": "2",
+			"employee": frappe.get_doc("Employee", employee),
+			"event_dt": get_datetime("2026-03-10 16:55:00"),
+			"formatted_time": "10-03-2026 16:55:00",
+			"attendance_date": getdate("2026-03-10"),
+			"entry_type": "OUT",
+			"device_id": "1",
+		})
+		_ingest_chunk([(0, event)], [None])
+
+		checkin = frappe.get_all(
+			"Employee Checkin", filters={"employee": employee}, fields=["shift", "shift_start", "shift_end"]
+		)[0]
+		self.assertEqual(checkin.shift, "_Test Ingest Shift")
+		self.assertEqual(checkin.shift_start, get_datetime("2026-03-10 08:00:00"))
+		self.assertEqual(checkin.shift_end, get_datetime("2026-03-10 17:00:00"))
+
+	def test_cancelled_attendance_is_replaced_on_the_next_in_punch(self):
+		employee = make_employee("rollup_cancel@example.com", company="_Test Company")
+
+		results = [None]
+		_ingest_chunk([(0, _in_event(employee, "2026-03-11 08:00:00", "3"))], results)
+		first = results[0]["attendance"]
+		self.assertEqual(frappe.db.get_value("Daily Attendance Rollup", rollup_name(employee, "2026-03-11"), "attendance"), first)
+
+		frappe.get_doc("Attendance", first).cancel()
+		self.assertIsNone(frappe.db.get_value("Daily Attendance Rollup", rollup_name(employee, "2026-03-11"), "attendance"))
+
+		_ingest_chunk([(0, _in_event(employee, "2026-03-11 09:00:00", "4"))], results)
+		second = results[0]["attendance"]
+		self.assertNotEqual(second, first)
+		self.assertEqual(frappe.db.get_value("Attendance", second, "docstatus"), 1)
+
+
+def _in_event(employee, time, index_no):
+	time = get_datetime(time)
+	return frappe._dict({
+		"index_no": index_no,
+		"employee": frappe.get_doc("Employee", employee),
+		"event_dt": time,
+		"formatted_time": time.strftime("%d-%m-%Y %H:%M:%S"),
+		"attendance_date": time.date(),
+		"entry_type": "IN",
+		"device_id": "1",
+	})
+
+
+def _lock_in_new_connection(keys):
+	site, sites_path = frappe.local.site, frappe.local.sites_path
+	result = {}
+
+	def lock():
+		frappe.init(site=site, sites_path=sites_path)
+		frappe.connect()
+		try:
+			frappe.db.sql("SET SESSION innodb_lock_wait_timeout = 1")
+			lock_attendance_days(keys)
+			result["locked"] = True
+		except frappe.QueryTimeoutError:
+			result["locked"] = False
+		finally:
+			frappe.db.rollback()
+			frappe.destroy()
+
+	thread = Thread(target=lock)
+	thread.start()
+	thread.join()
+	return result.get("locked")
@@ -0,0 +1,61 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from erpnext.setup.doctype.employee.test_employee import make_employee
+from frappe.tests.utils import FrappeTestCase
+
+from psc_hrms.apis.approver_routing import get_approver_route, rebuild_approver_routes
+
+
+class TestEmployeeApproverRoute(FrappeTestCase):
+	def test_route_resolves_supervisor_email(self):
+		supervisor = make_employee("route_supervisor@example.com", company="_Test Company")
+		frappe.db.set_value("Employee", supervisor, "prefered_email", "route_supervisor@example.com")
+		employee = make_employee("route_staff@example.com", company="_Test Company", reports_to=supervisor)
+
+		rebuild_approver_routes([employee])
+		route = get_approver_route(employee)
+
+		self.assertEqual(route.supervisor, supervisor)
+		self.assertEqual(route.supervisor_email, "route_supervisor@example.com")
+
+	def test_hod_approvers_follow_the_given_department(self):
+		employee = make_employee("route_mover@example.com", company="_Test Company")
+		department = frappe.get_doc({
+			"doctype": "Department",
+			"department_name": "_Test Route Claims",
+			"company": "_Test Company",
+			"leave_approvers": [{"approver": "test@example.com"}]
+		}).insert()
+		rebuild_approver_routes([employee])
+
+		self.assertEqual(get_approver_route(employee, department.name).hod_approver_emails, ["test@example.com"])
+
+	def test_rebuild_overwrites_routes_in_place(self):
+		employee = make_employee("route_rebuild@example.com", company="_Test Company")
+		rebuild_approver_routes([employee])
+		creation = frappe.db.get_value("Employee Approver Route", employee, "creation")
+
+		rebuild_approver_routes([employee])
+		self.assertEqual(frappe.db.get_value("Employee Approver Route", employee, "creation"), creation)
+
+	def test_new_hr_manager_is_added_to_routes(self):
+		employee = make_employee("route_hr@example.com", company="_Test Company")
+		rebuild_approver_routes([employee])
+
+		with patch("psc_hrms.apis.approver_routing._enqueue_rebuild") as enqueue_rebuild:
+			frappe.get_doc({
+				"doctype": "User",
+				"email": "route_new_hr_manager@example.com",
+				"first_name": "Route HR",
+				"send_welcome_email": 0,
+				"roles": [{"role": "HR Manager"}]
+			}).insert()
+		enqueue_rebuild.assert_called_with()
+
+		# what the enqueued job runs
+		rebuild_approver_routes()
+		self.assertIn("route_new_hr_manager@example.com", get_approver_route(employee).hr_manager_emails)
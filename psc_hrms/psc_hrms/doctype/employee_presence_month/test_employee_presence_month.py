@@ -0,0 +1,44 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+import frappe
+from erpnext.setup.doctype.employee.test_employee import make_employee
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate
+
+from psc_hrms.apis.presence_index import get_present_days, mark_present
+
+
+class TestEmployeePresenceMonth(FrappeTestCase):
+	def test_marked_days_are_found(self):
+		employee = make_employee("presence_staff@example.com", company="_Test Company")
+
+		mark_present([(employee, "2026-01-01"), (employee, "2026-01-31")])
+		mark_present([(employee, "2026-02-14")])
+
+		claimed = [getdate("2026-01-01"), getdate("2026-01-02"), getdate("2026-01-31"), getdate("2026-02-14")]
+		self.assertEqual(
+			get_present_days(employee, claimed),
+			{getdate("2026-01-01"), getdate("2026-01-31"), getdate("2026-02-14")}
+		)
+		self.assertEqual(frappe.db.get_value("Employee Presence Month", f"{employee}::2026-01", "days_bitmap"), 1 | 1 << 30)
+
+	def test_checkin_sets_and_cancel_recomputes_the_bit(self):
+		employee = make_employee("presence_cancel@example.com", company="_Test Company")
+		frappe.get_doc({
+			"doctype": "Employee Checkin", "employee": employee, "log_type": "IN", "time": "2026-04-06 08:00:00"
+		}).insert()
+		self.assertEqual(get_present_days(employee, ["2026-04-06"]), {getdate("2026-04-06")})
+
+		attendance = frappe.get_doc({
+			"doctype": "Attendance",
+			"employee": employee,
+			"attendance_date": "2026-04-07",
+			"company": "_Test Company",
+			"status": "Present"
+		}).submit()
+		self.assertEqual(get_present_days(employee, ["2026-04-07"]), {getdate("2026-04-07")})
+
+		# no checkin behind the cancelled Attendance, so the day is cleared; the checkin day stays
+		attendance.cancel()
+		self.assertEqual(get_present_days(employee, ["2026-04-06", "2026-04-07"]), {getdate("2026-04-06")})
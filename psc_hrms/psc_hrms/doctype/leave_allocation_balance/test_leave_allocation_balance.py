@@ -0,0 +1,53 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+import frappe
+from erpnext.setup.doctype.employee.test_employee import make_employee
+from frappe.tests.utils import FrappeTestCase
+
+from psc_hrms.apis.leave_balance import _reconcile, apply_allocation_delta, get_allocated_total, on_ledger_entry_insert
+
+
+class TestLeaveAllocationBalance(FrappeTestCase):
+	def test_deltas_accumulate_per_period(self):
+		employee = make_employee("balance_staff@example.com", company="_Test Company")
+
+		apply_allocation_delta(employee, "_Test Leave Type", "2026", 2, 1)
+		apply_allocation_delta(employee, "_Test Leave Type", "2026", 1.5, 1)
+		apply_allocation_delta(employee, "_Test Leave Type", "2027", 3, 1)
+
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type", 2026), 3.5)
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type"), 6.5)
+
+	def test_reconcile_removes_orphan_rows(self):
+		employee = make_employee("balance_orphan@example.com", company="_Test Company")
+		apply_allocation_delta(employee, "_Test Leave Type", "2026", 4, 1)
+
+		mismatches = _reconcile(fix=True)
+
+		self.assertIn(employee, [row["employee"] for row in mismatches])
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type"), 0)
+
+	def test_expiry_without_ledger_entry_is_reconciled(self):
+		employee = make_employee("balance_expiry@example.com", company="_Test Company")
+		allocation = frappe.get_doc({
+			"doctype": "Leave Allocation",
+			"employee": employee,
+			"leave_type": "_Test Leave Type",
+			"from_date": "2026-01-01",
+			"to_date": "2026-12-31",
+			"new_leaves_allocated": 5
+		}).submit()
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type", 2026), 5)
+
+		# carry-forward expiry leaves the allocation live
+		on_ledger_entry_insert(frappe._dict({
+			"is_expired": 1, "is_carry_forward": 1,
+			"transaction_type": "Leave Allocation", "transaction_name": allocation.name
+		}))
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type", 2026), 5)
+
+		# HRMS flags a fully used allocation expired without a ledger entry
+		frappe.db.set_value("Leave Allocation", allocation.name, "expired", 1)
+		_reconcile(fix=True)
+		self.assertEqual(get_allocated_total(employee, "_Test Leave Type", 2026), 0)
@@ -90,9 +90,9 @@ frappe.ui.form.on("Public Holiday and Off Days Claim Form", {
     
 });
 
-//Helper 
+//Helper: preview only, the server recounts (and verifies) the days on save
 function refresh_eligible_days(frm) {
-    const count = (frm.doc.table_bxck || []).filter(r => r.worked_on).length;
+    const count = new Set((frm.doc.table_bxck || []).filter(r => r.worked_on).map(r => r.worked_on)).size;
     frm.set_value('eligible_days', `${count} Day(s)`);
 }
 
@@ -101,8 +101,8 @@ frappe.ui.form.on('Claim Form Reference', {
         const row = locals[cdt][cdn];
 
         // —— 1) Prefill staff_name on new rows ——
-        if (!row.staff_name && frm.doc.for_staff) {
-            frappe.model.set_value(cdt, cdn, 'staff_name', frm.doc.for_staff);
+        if (!row.staff_name && frm.doc.staff_name) {
+            frappe.model.set_value(cdt, cdn, 'staff_name', frm.doc.staff_name);
         }
 
         // —— 2) Constrain the datepicker for worked_on ——
@@ -117,20 +117,9 @@ frappe.ui.form.on('Claim Form Reference', {
         });
     },
     table_bxck_add(frm, cdt, cdn) {
-        const row = locals[cdt][cdn];
-    
-        if (frm.doc.for_staff) {
-          // fetch the Employee.employee_name, then set staff_name to that
-          frappe.db
-            .get_value('Employee',
-                       frm.doc.for_staff,
-                       'employee_name'
-            )
-            .then(({ message }) => {
-              if (message && message.employee_name) {
-                frappe.model.set_value(cdt, cdn, 'staff_name', message.employee_name);
-              }
-            });
+        // staff_name is already fetched when for_staff is set
+        if (frm.doc.staff_name) {
+            frappe.model.set_value(cdt, cdn, 'staff_name', frm.doc.staff_name);
         }
     },
     after_insert(frm, cdt, cdn) {
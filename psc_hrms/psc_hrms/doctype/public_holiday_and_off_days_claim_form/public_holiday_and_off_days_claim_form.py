@@ -4,29 +4,107 @@
 # import frappe
 from frappe.model.document import Document
 import frappe
-from frappe.model.naming import make_autoname
-from frappe.utils import today
+from frappe.model.naming import getseries, make_autoname
+from frappe.utils import formatdate, getdate, today
 from frappe import _
+from erpnext.setup.doctype.employee.employee import get_holiday_list_for_employee
+from psc_hrms.apis.presence_index import get_present_days
+
+# tabSeries counter behind the claim form names
+CLAIM_SERIES_KEY = "PHODC-"
 
 class PublicHolidayandOffDaysClaimForm(Document):
     def autoname(self):
-        emp_name = None
-        if self.for_staff:
-            try:
-                emp_name = frappe.get_value("Employee", self.for_staff, "employee_name")
-            except Exception:
-                frappe.logger().warning(f"Could not fetch employee_name for {self.for_staff}")
+        # staff_name is fetched by the form when for_staff is set
+        emp_name = self.staff_name
+        if not emp_name and self.for_staff:
+            emp_name = self.staff_name = frappe.db.get_value("Employee", self.for_staff, "employee_name")
 
         if not emp_name:
             if self.meta.get("autoname"):
                 emp_name = make_autoname(self.meta.autoname)
             else:
                 emp_name = frappe.generate_hash()[:8]
-        self.name = f"{emp_name} | {today()}"
+
+        # One stable tabSeries key, so concurrent inserts only wait on its row lock; a fresh
+        # per-day key would make the first inserts of a day race on creating the row
+        self.name = f"{emp_name} | {today()} - " + getseries(CLAIM_SERIES_KEY, 5)
+
+    def validate(self):
+        self.set_eligible_days()
+
+    def before_submit(self):
+        if not self.eligible_day_count:
+            frappe.throw(_("None of the claimed days is an eligible Public Holiday or Off Day worked"))
+
+    def set_eligible_days(self):
+        """
+        Count the distinct claimed dates that are holidays/off days for the
+        staff member and on which the presence index shows them present.
+        Stored numerically so approval never has to parse `eligible_days`.
+        """
+        from_date = getdate(self.from_date) if self.from_date else None
+        to_date = getdate(self.to_date) if self.to_date else None
+
+        dates = set()
+        for row in self.table_bxck:
+            if not row.worked_on:
+                continue
+            worked_on = getdate(row.worked_on)
+            if (from_date and worked_on < from_date) or (to_date and worked_on > to_date):
+                frappe.throw(_("Row #{0}: the days claimed must be between {1} and {2}").format(
+                    row.idx, formatdate(from_date), formatdate(to_date)
+                ))
+            dates.add(worked_on)
+
+        if dates and self.for_staff:
+            off_days = get_off_days(self.for_staff, dates)
+            if off_days is not None and dates - off_days:
+                frappe.throw(_("{0} not a Public Holiday or Off Day for {1}").format(
+                    ", ".join(formatdate(d) for d in sorted(dates - off_days)),
+                    self.staff_name or self.for_staff
+                ))
+
+            worked = get_present_days(self.for_staff, dates)
+            for row in self.table_bxck:
+                row.verified = 1 if row.worked_on and getdate(row.worked_on) in worked else 0
+            if dates - worked:
+                frappe.msgprint(
+                    _("No attendance or check-in found for {0}; these days are not counted.").format(
+                        ", ".join(formatdate(d) for d in sorted(dates - worked))
+                    ),
+                    indicator="orange",
+                    alert=True
+                )
+            dates &= worked
+
+        self.eligible_day_count = len(dates)
+        self.eligible_days = f"{len(dates)} Day(s)"
+
+
+def get_off_days(employee, dates):
+    """
+    The subset of `dates` listed in the employee's Holiday List (public
+    holidays and weekly offs), or None when no Holiday List applies.
+    """
+    holiday_list = get_holiday_list_for_employee(employee, raise_exception=False)
+    if not holiday_list:
+        return None
+
+    return {
+        getdate(day) for day in frappe.get_all(
+            "Holiday",
+            filters={"parent": holiday_list, "holiday_date": ["in", list(dates)]},
+            pluck="holiday_date"
+        )
+    }
 
 
 import frappe
 from frappe import _
+from psc_hrms.apis.notifications import queue_notification
+from psc_hrms.apis.email_templates import render_email_template
+from psc_hrms.apis.approver_routing import get_approver_route
 
 def notify_supervisor(doc, method=None):
     """
@@ -39,47 +117,35 @@ def notify_supervisor(doc, method=None):
     template_name = "Claim Form Informative Notices"
     
     try:
-        email_template = frappe.get_doc("Email Template", template_name)
+        subject, message = render_email_template(template_name, doc)
     except frappe.DoesNotExistError:
         frappe.log_error(_("Email Template '{0}' not found").format(template_name))
         return
-
-    context = doc.as_dict()
-    subject = frappe.render_template(email_template.subject, context)
-    message = frappe.render_template(email_template.response, context)
     
     if not doc.for_staff:
         frappe.log_error(_("Employee not specified in document"))
         return
         
     try:
-        employee = frappe.get_doc("Employee", doc.for_staff)
-        if not employee.reports_to:
-            frappe.log_error(_("No supervisor set for employee: {0}").format(employee.name))
+        route = get_approver_route(doc.for_staff)
+        if not route.supervisor:
+            frappe.log_error(_("No supervisor set for employee: {0}").format(doc.for_staff))
             return
             
-        supervisor = frappe.get_doc("Employee", employee.reports_to)
-        if not supervisor.prefered_email:
-            frappe.log_error(_("No email found for supervisor: {0}").format(supervisor.name))
+        if not route.supervisor_email:
+            frappe.log_error(_("No email found for supervisor: {0}").format(route.supervisor))
             return
             
-        frappe.sendmail(
-            recipients=[supervisor.prefered_email],
-            subject=subject,
-            message=message,
-            reference_doctype=doc.doctype,
-            reference_name=doc.name,
-            now=True
-        )
+        queue_notification(doc, [route.supervisor_email], subject, message)
         
     except Exception as e:
         frappe.log_error(_("Error processing supervisor notification: {0}").format(str(e)))
 
 import frappe
-import re
 from frappe import _
 from frappe.utils import flt, today, getdate, now_datetime
 from datetime import date
+from psc_hrms.apis.leave_balance import get_allocated_total
 
 def notify_users(doc=None, method=None, doc_name=None):
     """
@@ -109,56 +175,29 @@ def notify_users(doc=None, method=None, doc_name=None):
     # Process workflow state changes
     if doc.workflow_state in pending_states:
         try:
-            email_template = frappe.get_doc("Email Template", template_name)
+            subject, message = render_email_template(template_name, doc)
         except frappe.DoesNotExistError:
             frappe.log_error(_("Email Template '{0}' not found").format(template_name))
             return
-
-        context = doc.as_dict()
-        subject = frappe.render_template(email_template.subject, context)
-        message = frappe.render_template(email_template.response, context)
         recipients = []
         error_logged = False
 
+        route = get_approver_route(doc.for_staff, doc.department) if doc.for_staff else frappe._dict()
+
         # HOD Approval Path
         if doc.workflow_state == "Pending Approval by HOD":
             if not doc.department:
                 frappe.log_error(_("Department not set in document"))
                 error_logged = True
+            elif route.hod_approver_emails:
+                recipients = route.hod_approver_emails
             else:
-                try:
-                    department = frappe.get_doc("Department", doc.department)
-                    if hasattr(department, 'leave_approvers'):
-                        approvers = [row.approver for row in department.leave_approvers if row.approver]
-                        if approvers:
-                            recipients = approvers
-                        else:
-                            frappe.log_error(_("No approvers found in department: {0}").format(doc.department))
-                            error_logged = True
-                    else:
-                        frappe.log_error(_("Department {0} has no leave_approvers table").format(doc.department))
-                        error_logged = True
-                except Exception as e:
-                    frappe.log_error(_("Error fetching department approvers: {0}").format(str(e)))
-                    error_logged = True
+                frappe.log_error(_("No approvers found in department: {0}").format(doc.department))
+                error_logged = True
 
         # HRM Approval Path
         elif doc.workflow_state == "Pending Approval by HRM":
-            hr_managers = frappe.get_all(
-                "Has Role",
-                filters={
-                    "role": "HR Manager",
-                    "parenttype": "User"
-                },
-                distinct=True,
-                pluck="parent"
-            )
-            if hr_managers:
-                recipients = frappe.get_all(
-                    "User",
-                    filters={"name": ["in", hr_managers], "enabled": 1},
-                    pluck="email"
-                )
+            recipients = route.hr_manager_emails
             if not recipients:
                 frappe.log_error(_("No active HR Managers found with valid email addresses"))
                 error_logged = True
@@ -168,33 +207,18 @@ def notify_users(doc=None, method=None, doc_name=None):
             if not doc.for_staff:
                 frappe.log_error(_("Employee not specified in document"))
                 error_logged = True
+            elif not route.supervisor:
+                frappe.log_error(_("No supervisor set for employee: {0}").format(doc.for_staff))
+                error_logged = True
+            elif route.supervisor_email:
+                recipients = [route.supervisor_email]
             else:
-                try:
-                    employee = frappe.get_doc("Employee", doc.for_staff)
-                    if not employee.reports_to:
-                        frappe.log_error(_("No supervisor set for employee: {0}").format(employee.name))
-                        error_logged = True
-                    else:
-                        supervisor = frappe.get_doc("Employee", employee.reports_to)
-                        if supervisor.prefered_email:
-                            recipients = [supervisor.prefered_email]
-                        else:
-                            frappe.log_error(_("No email found for supervisor: {0}").format(supervisor.name))
-                            error_logged = True
-                except Exception as e:
-                    frappe.log_error(_("Error fetching supervisor: {0}").format(str(e)))
-                    error_logged = True
+                frappe.log_error(_("No email found for supervisor: {0}").format(route.supervisor))
+                error_logged = True
 
         # Send emails if valid recipients
         if recipients and not error_logged:
-            frappe.sendmail(
-                recipients=recipients,
-                subject=subject,
-                message=message,
-                reference_doctype=doc.doctype,
-                reference_name=doc.name,
-                now=True
-            )
+            queue_notification(doc, recipients, subject, message)
 
     # Handle final approval state
     if doc.workflow_state == "Approved by HRM":
@@ -207,67 +231,67 @@ def notify_users(doc=None, method=None, doc_name=None):
         #     update_modified=False
         # )
         
+        if frappe.flags.in_bulk_claim_approval:
+            # The bulk job creates the allocations per employee once all transitions are applied
+            frappe.flags.bulk_claim_approved.append(doc)
+            return
+
         try:
-            # Extract numeric value from eligible_days (e.g., "1 Day(s)" -> 1.0)
-            days_match = re.search(r"(\d+(\.\d+)?)", doc.eligible_days)
-            if not days_match:
-                frappe.throw(_("Could not parse eligible days: {0}").format(doc.eligible_days))
-            new_leaves = flt(days_match.group(1))
-            
-            # Get department details
-            department = frappe.get_doc("Department", doc.department)
-            
-            # Calculate existing allocations
-            existing_allocs = frappe.get_all(
-                "Leave Allocation",
-                filters={
-                    "employee": doc.for_staff,
-                    "leave_type": "Public Holiday compensation",
-                    "expired": 0,
-                    "docstatus": 1
-                },
-                fields=["SUM(total_leaves_allocated) as total_allocated"]
-            )
-            
-            total_existing = flt(existing_allocs[0].total_allocated) if existing_allocs else 0
-            new_total = total_existing + new_leaves
-            
-            # Calculate end of year date
-            current_year = date.today().year
-            to_date = getdate(f"{current_year}-12-31")
-            
-            # Create new Leave Allocation
-            alloc_doc = frappe.get_doc({
-                "doctype": "Leave Allocation",
-                "employee": doc.for_staff,
-                "posting_date": today(),
-                "department": doc.department,
-                "company": department.company,
-                "leave_type": "Public Holiday compensation",
-                "from_date": today(),
-                "to_date": to_date,
-                "new_leaves_allocated": new_leaves,
-                "carry_forward": 1,
-                "total_leaves_allocated": new_total,
-                "description": "AUTOGENERATED by Claim Form APPROVED."
-            })
-            
-            alloc_doc.insert(ignore_permissions=True)
-            alloc_doc.submit()
+            # Computed in validate
+            new_leaves = flt(doc.eligible_day_count)
+            if not new_leaves:
+                frappe.throw(_("No eligible days to allocate for {0}").format(doc.name))
+
+            alloc_name = create_claim_allocation(doc.for_staff, doc.department, new_leaves)
             frappe.db.set_value(
 				doc.doctype,
 				doc.name,
 				{
-					"leave_allocation": alloc_doc.name,
+					"leave_allocation": alloc_name,
 					"approved_on": now_datetime()
 				},
 				update_modified=False
 			)
             
             frappe.msgprint(_("Leave Allocation {0} created and linked successfully").format(
-				frappe.utils.get_link_to_form("Leave Allocation", alloc_doc.name)
+				frappe.utils.get_link_to_form("Leave Allocation", alloc_name)
 			))
 						
         except Exception as e:
             frappe.log_error(_("Error creating Leave Allocation: {0}").format(str(e)))
-            frappe.msgprint(_("Failed to create Leave Allocation: {0}").format(str(e)), alert=True, indicator="red")
\ No newline at end of file
+            frappe.msgprint(_("Failed to create Leave Allocation: {0}").format(str(e)), alert=True, indicator="red")
+
+def create_claim_allocation(employee, department, new_leaves):
+    """
+    Insert and submit the Public Holiday compensation Leave Allocation for
+    approved claims, running to the end of the current year.
+    """
+    company = frappe.get_cached_value("Department", department, "company")
+
+    # Existing non-expired allocations, from the maintained balance rows
+    total_existing = get_allocated_total(employee, "Public Holiday compensation")
+    new_total = total_existing + new_leaves
+
+    # Calculate end of year date
+    current_year = date.today().year
+    to_date = getdate(f"{current_year}-12-31")
+
+    # Create new Leave Allocation
+    alloc_doc = frappe.get_doc({
+        "doctype": "Leave Allocation",
+        "employee": employee,
+        "posting_date": today(),
+        "department": department,
+        "company": company,
+        "leave_type": "Public Holiday compensation",
+        "from_date": today(),
+        "to_date": to_date,
+        "new_leaves_allocated": new_leaves,
+        "carry_forward": 1,
+        "total_leaves_allocated": new_total,
+        "description": "AUTOGENERATED by Claim Form APPROVED."
+    })
+
+    alloc_doc.insert(ignore_permissions=True)
+    alloc_doc.submit()
+    return alloc_doc.name
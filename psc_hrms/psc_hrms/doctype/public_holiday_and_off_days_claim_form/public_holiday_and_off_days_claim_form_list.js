@@ -0,0 +1,66 @@
+// Copyright (c) 2026, Techsavanna Technology and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Public Holiday and Off Days Claim Form"] = {
+    onload(listview) {
+        listview.page.add_action_item(__("Bulk Workflow Action"), () => {
+            const names = listview.get_checked_items(true);
+            if (!names.length) {
+                frappe.msgprint(__("Select at least one claim form"));
+                return;
+            }
+
+            const dialog = new frappe.ui.Dialog({
+                title: __("Apply Workflow Action to {0} Claim(s)", [names.length]),
+                fields: [
+                    {
+                        fieldname: "action",
+                        fieldtype: "Select",
+                        label: __("Action"),
+                        options: ["Approve", "Submit to HOD", "Submit to HR", "Reject", "Revoke", "Disapprove"],
+                        default: "Approve",
+                        reqd: 1
+                    }
+                ],
+                primary_action_label: __("Apply"),
+                primary_action({ action }) {
+                    dialog.hide();
+                    frappe
+                        .xcall("psc_hrms.apis.claim_workflow.bulk_apply_claim_action", { names, action })
+                        .then(({ batch_id }) => track_bulk_claim_action(listview, batch_id));
+                }
+            });
+            dialog.show();
+        });
+    }
+};
+
+function track_bulk_claim_action(listview, batch_id) {
+    frappe.show_alert({ message: __("Bulk workflow action queued"), indicator: "blue" });
+
+    const handler = (report) => {
+        if (report.batch_id !== batch_id) return;
+
+        frappe.show_progress(__("Applying Workflow Action"), report.done, report.total,
+            __("{0} of {1} claim(s) processed", [report.done, report.total]));
+        if (!report.finished) return;
+
+        frappe.realtime.off("psc_hrms_bulk_claim_progress", handler);
+        frappe.hide_progress();
+        listview.refresh();
+
+        if (!report.failed.length) {
+            frappe.show_alert({ message: __("{0} claim(s) updated", [report.succeeded]), indicator: "green" });
+            return;
+        }
+        const rows = report.failed
+            .map(row => `<tr><td>${frappe.utils.get_form_link("Public Holiday and Off Days Claim Form", row.name, true)}</td><td>${frappe.utils.escape_html(row.error)}</td></tr>`)
+            .join("");
+        frappe.msgprint({
+            title: __("{0} claim(s) updated, {1} failed", [report.succeeded, report.failed.length]),
+            indicator: "orange",
+            message: `<table class="table table-bordered"><tr><th>${__("Claim")}</th><th>${__("Error")}</th></tr>${rows}</table>`
+        });
+    };
+    frappe.realtime.on("psc_hrms_bulk_claim_progress", handler);
+}
@@ -1,9 +1,66 @@
 # Copyright (c) 2025, Techsavanna Technology and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from psc_hrms.apis.email_templates import render_email_template
 
 
 class TestPublicHolidayandOffDaysClaimForm(FrappeTestCase):
-	pass
+	def test_claimed_date_outside_range_is_rejected(self):
+		claim = frappe.get_doc({
+			"doctype": "Public Holiday and Off Days Claim Form",
+			"from_date": "2026-01-01",
+			"to_date": "2026-01-31",
+			"table_bxck": [{"worked_on": "2026-02-01"}]
+		})
+		self.assertRaises(frappe.ValidationError, claim.set_eligible_days)
+
+	def test_no_claimed_dates_counts_zero(self):
+		claim = frappe.get_doc({
+			"doctype": "Public Holiday and Off Days Claim Form",
+			"from_date": "2026-01-01",
+			"to_date": "2026-01-31",
+			"table_bxck": [{"reason": "Mandatory Shift"}]
+		})
+		claim.set_eligible_days()
+		self.assertEqual(claim.eligible_day_count, 0)
+		self.assertEqual(claim.eligible_days, "0 Day(s)")
+		self.assertRaises(frappe.ValidationError, claim.before_submit)
+
+	def test_same_day_claims_get_distinct_names(self):
+		names = set()
+		for _i in range(2):
+			claim = frappe.get_doc({
+				"doctype": "Public Holiday and Off Days Claim Form",
+				"staff_name": "_Test Claim Staff"
+			})
+			claim.autoname()
+			names.add(claim.name)
+
+		self.assertEqual(len(names), 2)
+		self.assertTrue(all(name.startswith(f"_Test Claim Staff | {today()} - ") for name in names))
+
+	def test_email_template_renders_with_frappe_globals(self):
+		if not frappe.db.exists("Email Template", "_Test Claim Notice"):
+			frappe.get_doc({
+				"doctype": "Email Template",
+				"name": "_Test Claim Notice",
+				"subject": "Claim for {{ staff_name }}",
+				"response": "{{ _('Eligible Days') }}: {{ eligible_days }} "
+					"{{ frappe.utils.get_url_to_form('Public Holiday and Off Days Claim Form', name) }}"
+			}).insert(ignore_permissions=True)
+
+		claim = frappe.get_doc({
+			"doctype": "Public Holiday and Off Days Claim Form",
+			"name": "_Test Claim 0001",
+			"staff_name": "_Test Claim Staff",
+			"eligible_days": "2 Day(s)"
+		})
+		subject, message = render_email_template("_Test Claim Notice", claim)
+
+		self.assertEqual(subject, "Claim for _Test Claim Staff")
+		self.assertIn("Eligible Days: 2 Day(s)", message)
+		self.assertIn("_Test Claim 0001", message)
@@ -0,0 +1,71 @@
+// Copyright (c) 2026, Techsavanna Technology and contributors
+// For license information, please see license.txt
+
+frappe.pages["api-metrics"].on_page_load = function (wrapper) {
+    const page = frappe.ui.make_app_page({
+        parent: wrapper,
+        title: __("API Metrics"),
+        single_column: true
+    });
+    const $body = $(`<div class="api-metrics"></div>`).appendTo(page.main);
+
+    const refresh = () => {
+        frappe.xcall("psc_hrms.apis.instrumentation.get_metrics_summary").then((summary) => render($body, summary));
+    };
+
+    page.set_primary_action(__("Refresh"), refresh, "refresh");
+    page.add_menu_item(__("Profile Slow Calls"), () => {
+        frappe.prompt([
+            { fieldname: "sample_rate", fieldtype: "Float", label: __("Sample Rate (0 to 1, 0 switches off)"), default: 0.1, reqd: 1 },
+            { fieldname: "slow_ms", fieldtype: "Float", label: __("Keep Profiles Slower Than (ms)"), default: 1000, reqd: 1 }
+        ], (values) => {
+            frappe.xcall("psc_hrms.apis.instrumentation.set_profiling", values).then(refresh);
+        }, __("Sampling Profiler"));
+    });
+    page.add_menu_item(__("Reset Metrics"), () => {
+        frappe.confirm(__("Clear all collected metrics and profiles?"), () => {
+            frappe.xcall("psc_hrms.apis.instrumentation.reset_metrics").then(refresh);
+        });
+    });
+
+    refresh();
+};
+
+function render($body, summary) {
+    const ms = (value) => (value === null || value === undefined ? "> 60000" : value);
+    const rows = summary.endpoints.map((row) => `
+        <tr>
+            <td><code>${frappe.utils.escape_html(row.endpoint)}</code></td>
+            <td class="text-right">${row.calls}</td>
+            <td class="text-right ${row.errors ? "text-danger" : ""}">${row.errors}</td>
+            <td class="text-right">${row.avg_ms}</td>
+            <td class="text-right">${ms(row.p50_ms)}</td>
+            <td class="text-right">${ms(row.p99_ms)}</td>
+            <td class="text-right">${row.queries_per_call}</td>
+            <td class="text-right">${Math.round(row.query_share * 100)}%</td>
+            <td class="text-right">${row.rows_per_call}</td>
+        </tr>`).join("");
+
+    const profiling = summary.profiling
+        ? __("Profiling {0}% of calls, keeping those slower than {1} ms.", [summary.profiling.sample_rate * 100, summary.profiling.slow_ms])
+        : __("Sampling profiler is off.");
+
+    const profiles = summary.profiles.map((profile) => `
+        <details class="mb-2">
+            <summary><code>${frappe.utils.escape_html(profile.endpoint)}</code> ${profile.duration_ms} ms, ${profile.at}</summary>
+            <pre class="small">${frappe.utils.escape_html(profile.stats)}</pre>
+        </details>`).join("");
+
+    $body.html(`
+        <p class="text-muted">${__("p50/p99 are bucket upper bounds.")} ${profiling}</p>
+        <table class="table table-bordered table-hover">
+            <thead><tr>
+                <th>${__("Endpoint")}</th><th>${__("Calls")}</th><th>${__("Errors")}</th><th>${__("Avg ms")}</th>
+                <th>${__("p50 ms")}</th><th>${__("p99 ms")}</th><th>${__("Queries/Call")}</th>
+                <th>${__("Time in DB")}</th><th>${__("Rows/Call")}</th>
+            </tr></thead>
+            <tbody>${rows || `<tr><td colspan="9" class="text-muted">${__("No calls recorded yet")}</td></tr>`}</tbody>
+        </table>
+        ${profiles ? `<h5>${__("Recent Profiles")}</h5>${profiles}` : ""}
+    `);
+}